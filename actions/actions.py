@@ -7,32 +7,76 @@
 
 # This is a simple example for a custom action which utters "Hello World!"
 
+import asyncio
+import functools
 import json
+import logging
+import time
 from abc import ABC, abstractmethod
 from typing import Any, Text, Dict, List
 
-import requests
 from rasa_sdk import Action, Tracker
 from rasa_sdk.events import SlotSet, ActionReverted, AllSlotsReset, FollowupAction
 from requests.models import PreparedRequest
 
-base_url = "http://127.0.0.1:8000"
-api_url = "http://127.0.0.1:8000/api"
+from .api import base_url, client, ServiceUnavailable
+from .cache import course_cache, normalize_name, role_cache, remember_roles, forget_roles, response_cache, \
+    response_key, invalidate_responses
+from .catalog import catalog
+from .config import config
+from .metrics import timed, register, Gauges
+
+logger = logging.getLogger(__name__)
 
 map_resource_types_to_uri = {'category': 'category', 'language': 'language', 'code': 'programming-language'}
 map_resource_types_to_plural_uri = {'category': 'categories', 'language': 'languages', 'code': 'programming-languages'}
 
+# Course listings only fetch the page and the fields they show
+course_page_size = 3
+course_list_fields = ["id", "name", "price"]
+# Courses remembered in the course_refs slot so follow-up turns use their id without resolving their name
+course_refs_size = 10
+# Rows per page of admin tables and the fields they show
+table_page_size = 10
+table_fields = ["id", "name"]
+# Actions kept waiting for a login
+pending_queue_size = 5
+# Seconds an action waits for its concurrent backend lookups
+action_deadline = config["action_deadline"]
+
+
+def fail_fast(run):
+    """
+    Answer that the service is busy instead of failing when the ILearning API is unavailable or too slow
+    :param run: run method of an action
+    :return: the wrapped run method
+    """
+
+    @functools.wraps(run)
+    async def wrapper(self, dispatcher, tracker, domain):
+        try:
+            return await run(self, dispatcher, tracker, domain)
+        except (ServiceUnavailable, asyncio.TimeoutError):
+            dispatcher.utter_message(response="utter_service_busy")
+            return []
+
+    return wrapper
+
 
 class PendingAction(Action, ABC):
+    # Role checked by condition, the roles of all the queued actions are fetched at once after login
+    required_role = None
+    # What the action does, told to the user when a queued action is not performed
+    description = None
 
     @staticmethod
     @abstractmethod
-    def perform(dispatcher, tracker: Tracker, domain=None, access_token=None, **kwargs):
+    async def perform(dispatcher, tracker: Tracker, domain=None, access_token=None, **kwargs):
         raise NotImplementedError("An pending action must implement perform")
 
     @staticmethod
     @abstractmethod
-    def condition(tracker: Tracker, **kwargs):
+    async def condition(tracker: Tracker, **kwargs):
         raise NotImplementedError("An pending action must implement condition method")
 
     @staticmethod
@@ -46,6 +90,8 @@ class ActionCheckCourses(Action):
     def name(self) -> Text:
         return "action_check_courses"
 
+    @fail_fast
+    @timed
     async def run(
             self, dispatcher, tracker: Tracker, domain: Dict[Text, Any],
     ) -> List[Dict[Text, Any]]:
@@ -56,26 +102,36 @@ class ActionCheckCourses(Action):
             if entity["entity"] == "course_keyword":
                 keywords.append(entity["value"])
 
+        return await self.show_page(dispatcher, keywords)
+
+    @staticmethod
+    async def show_page(dispatcher, keywords, cursor=None):
         # Params for query
         params = {}
         if keywords is not None:
             params["keywords[]"] = keywords
 
-        response = requests.get(f"{api_url}/courses", params=params)
+        response = await client.get("/courses", params={**params, **page_params(cursor)})
         message = "Something went wrong!"
         recent_courses = []
+        refs = []
+        next_page = None
         if response.ok:
-            data = json.loads(response.content)
+            data = response.json()
             if len(data["data"]) == 0:
-                if keywords is not None:
+                if cursor is not None:
+                    message = "There is no more courses"
+                elif keywords is not None:
                     message = "Sorry there is no courses for %s" % ', '.join(keywords)
                 else:
                     message = "Sorry there is no such courses"
             else:
                 c = ', '.join(keywords) + " " if keywords is not None else ""
-                message = f"Here are some {c}courses for you: "
-                recent_courses = list(map(lambda x: x["name"], data["data"][:3]))
-                message += ', '.join(list(map(lambda x: x["name"], data["data"][:3])))
+                message = f"Here are some {'more ' if cursor else ''}{c}courses for you: "
+                recent_courses = list(map(lambda x: x["name"], data["data"][:course_page_size]))
+                refs = list(map(course_ref, data["data"][:course_page_size]))
+                message += ', '.join(recent_courses)
+                next_page = next_page_cursor(data, "action_check_courses", keywords)
 
         req = PreparedRequest()
         req.prepare_url(f"{base_url}/courses", params)
@@ -83,7 +139,8 @@ class ActionCheckCourses(Action):
         json_message = {"text": message, "link": {"url": req.url, "title": "Show more"}}
         dispatcher.utter_message(json_message=json_message)
 
-        return [SlotSet("recent_courses", recent_courses)]
+        return [SlotSet("recent_courses", recent_courses), SlotSet("course_refs", refs),
+                SlotSet("courses_cursor", next_page)]
 
 
 class ActionShowCourses(Action):
@@ -108,8 +165,34 @@ class ActionShowCourses(Action):
         return []
 
 
+class ActionNextCourses(Action):
+
+    def name(self) -> Text:
+        return "action_next_courses"
+
+    @fail_fast
+    @timed
+    async def run(
+            self, dispatcher, tracker: Tracker, domain: Dict[Text, Any],
+    ) -> List[Dict[Text, Any]]:
+        courses_cursor = tracker.get_slot("courses_cursor")
+        if courses_cursor is None:
+            dispatcher.utter_message(response="utter_no_more_courses")
+            return []
+
+        if courses_cursor["action"] == ActionShowMyCourses.get_name():
+            access_token = tracker.get_slot("access_token")
+            if access_token is None:
+                return [FollowupAction('login_form')]
+            return await ActionShowMyCourses.show_page(dispatcher, courses_cursor["keywords"], access_token,
+                                                       courses_cursor["cursor"])
+        return await ActionCheckCourses.show_page(dispatcher, courses_cursor["keywords"], courses_cursor["cursor"])
+
+
 class ActionRegister(Action):
 
+    @fail_fast
+    @timed
     async def run(self, dispatcher, tracker: Tracker, domain) -> List[
         Dict[Text, Any]]:
         username = tracker.get_slot("username")
@@ -118,15 +201,15 @@ class ActionRegister(Action):
 
         if email is None or password is None:
             return [FollowupAction("utter_not_enough_info")]
-        results = requests.post(f"{api_url}/register",
-                                data={"username": username, 'email': email, 'password': password,
-                                      "password_confirmation": password})
+        results = await client.post("/register",
+                                    data={"username": username, 'email': email, 'password': password,
+                                          "password_confirmation": password})
         if not results.ok:
             # Do not return as follow-up action or will contradict the rule
             dispatcher.utter_message(response="utter_register_failed")
             return []
 
-        json_res = json.loads(results.content)
+        json_res = results.json()
         name = json_res["data"]["name"]
         # personal access token for later request
         access_token = json_res["data"]["token"]
@@ -140,10 +223,13 @@ class ActionRegister(Action):
 
 
 class EnrollCourse(PendingAction):
+    description = "enroll in the course"
 
+    @fail_fast
+    @timed
     async def run(self, dispatcher, tracker: Tracker, domain) -> List[
         Dict[Text, Any]]:
-        return self.perform(dispatcher, tracker)
+        return await self.perform(dispatcher, tracker)
 
     def name(self):
         return self._name()
@@ -157,7 +243,8 @@ class EnrollCourse(PendingAction):
         return EnrollCourse._name()
 
     @staticmethod
-    def perform(dispatcher, tracker: Tracker, domain=None, access_token=None, **kwargs):
+    @timed
+    async def perform(dispatcher, tracker: Tracker, domain=None, access_token=None, **kwargs):
         # Get the course name user have chosen
         course_name = tracker.get_slot("likely_course") or tracker.get_slot("course_name")
         if course_name is None:
@@ -166,12 +253,11 @@ class EnrollCourse(PendingAction):
                 return [FollowupAction("utter_enroll_failed")]
             course_name = recent_courses[0]
         # Check if is valid course
-        data = json.loads(requests.get(f"{api_url}/similar-courses", params={"course_name": course_name}).content)[
-            "data"]
+        data = await resolve_course(course_name, tracker=tracker, required_fields=("id", "price"))
         if data["course"] is None:
             if data["extras"] is not None and len(data["extras"]) > 0:
-                likely_course = data["extras"][0]["name"]
-                return [SlotSet("likely_course", likely_course), FollowupAction("utter_course_not_found_and_suggest")]
+                return [*remember_likely_course(tracker, data["extras"][0]),
+                        FollowupAction("utter_course_not_found_and_suggest")]
 
             return [FollowupAction("utter_course_not_found")]
 
@@ -181,12 +267,12 @@ class EnrollCourse(PendingAction):
         # Not login yet, save pending action and login to continue
         access_token = access_token or tracker.get_slot("access_token")
         if access_token is None:
-            return [SlotSet("pending_action", EnrollCourse._name()), FollowupAction('login_form')]
+            return [*queue_pending_action(tracker, EnrollCourse._name()), FollowupAction('login_form')]
 
         # Enroll course
-        results = EnrollCourse._perform(course_name, access_token)
+        results = await EnrollCourse._perform(course_name, access_token)
 
-        response = json.loads(results.content)
+        response = results.json()
         # Failed
         if not results.ok or not response["success"]:
             if response["extras"] is not None and len(response["extras"]) > 0:
@@ -202,21 +288,20 @@ class EnrollCourse(PendingAction):
         return [FollowupAction("action_listen")]
 
     @staticmethod
-    def _perform(course_name, access_token):
+    async def _perform(course_name, access_token):
         # Get the course name user have chosen
         if course_name is None:
             return None
 
         # Enroll course request
-        headers = {'Accept': 'application/json',
-                   'Authorization': f'Bearer {access_token}'}
-        results = requests.post(f"{api_url}/courses/enroll",
-                                data={'course_name': course_name},
-                                headers=headers)
+        results = await client.post("/courses/enroll",
+                                    data={'course_name': course_name},
+                                    access_token=access_token)
+        await course_cache.ainvalidate(normalize_name(course_name))
         return results
 
     @staticmethod
-    def condition(tracker, **kwargs):
+    async def condition(tracker, **kwargs):
         access_token = kwargs.get("access_token", None)
         condition = (access_token or tracker.get_slot("access_token")) is not None
         return condition, "OK" if condition else "Need to login"
@@ -224,6 +309,8 @@ class EnrollCourse(PendingAction):
 
 class ActionDetailCourse(Action):
 
+    @fail_fast
+    @timed
     async def run(self, dispatcher, tracker: Tracker, domain) -> List[
         Dict[Text, Any]]:
         # Get the course name user have chosen
@@ -234,12 +321,11 @@ class ActionDetailCourse(Action):
                 return [FollowupAction("utter_please_choose_course")]
             course_name = recent_courses[0]
         # Check if is valid course
-        data = json.loads(requests.get(f"{api_url}/similar-courses", params={"course_name": course_name}).content)[
-            "data"]
+        data = await resolve_course(course_name, tracker=tracker)
         if data["course"] is None:
             if data["extras"] is not None and len(data["extras"]) > 0:
-                likely_course = data["extras"][0]["name"]
-                return [SlotSet("likely_course", likely_course), FollowupAction("utter_course_not_found_and_suggest")]
+                return [*remember_likely_course(tracker, data["extras"][0]),
+                        FollowupAction("utter_course_not_found_and_suggest")]
 
             return [FollowupAction("utter_course_not_found")]
 
@@ -258,6 +344,8 @@ class ActionBuyCourse(Action):
     def name(self) -> Text:
         return 'action_buy_course'
 
+    @fail_fast
+    @timed
     async def run(self, dispatcher, tracker: Tracker, domain):
         # Get the course name user have chosen
         course_name = tracker.get_slot("likely_course") or tracker.get_slot("course_name")
@@ -267,12 +355,11 @@ class ActionBuyCourse(Action):
                 return [FollowupAction("utter_enroll_failed")]
             course_name = recent_courses[0]
         # Check if is valid course
-        data = json.loads(requests.get(f"{api_url}/similar-courses", params={"course_name": course_name}).content)[
-            "data"]
+        data = await resolve_course(course_name, tracker=tracker)
         if data["course"] is None:
             if data["extras"] is not None and len(data["extras"]) > 0:
-                likely_course = data["extras"][0]["name"]
-                return [SlotSet("likely_course", likely_course), FollowupAction("utter_course_not_found_and_suggest")]
+                return [*remember_likely_course(tracker, data["extras"][0]),
+                        FollowupAction("utter_course_not_found_and_suggest")]
 
             return [FollowupAction("utter_course_not_found")]
 
@@ -286,6 +373,7 @@ class ActionBuyCourse(Action):
 
 
 class ActionShowMyCourses(PendingAction):
+    description = "show your courses"
 
     def name(self) -> Text:
         return self._name()
@@ -298,18 +386,21 @@ class ActionShowMyCourses(PendingAction):
     def get_name():
         return ActionShowMyCourses._name()
 
+    @fail_fast
+    @timed
     async def run(
             self, dispatcher, tracker: Tracker, domain: Dict[Text, Any],
     ) -> List[Dict[Text, Any]]:
-        return self.perform(dispatcher, tracker, domain)
+        return await self.perform(dispatcher, tracker, domain)
 
     # noinspection PyUnusedLocal
     @staticmethod
-    def perform(dispatcher, tracker, domain=None, access_token=None, **kwargs):
+    @timed
+    async def perform(dispatcher, tracker, domain=None, access_token=None, **kwargs):
         # Not login yet, save pending action and login to continue
         access_token = access_token or tracker.get_slot("access_token")
         if access_token is None:
-            return [SlotSet("pending_action", ActionShowMyCourses._name()), FollowupAction('login_form')]
+            return [*queue_pending_action(tracker, ActionShowMyCourses._name()), FollowupAction('login_form')]
 
         keywords = []
         # Search with category
@@ -317,28 +408,36 @@ class ActionShowMyCourses(PendingAction):
             if entity["entity"] == "course_keyword":
                 keywords.append(entity["value"])
 
+        return await ActionShowMyCourses.show_page(dispatcher, keywords, access_token)
+
+    @staticmethod
+    async def show_page(dispatcher, keywords, access_token, cursor=None):
         # Params for query
         params = {}
         if keywords is not None:
             params["keywords[]"] = keywords
 
-        headers = {'Accept': 'application/json',
-                   'Authorization': f'Bearer {access_token}'}
-        response = requests.get(f"{api_url}/courses/my-courses", headers=headers)
+        response = await client.get("/courses/my-courses", params=page_params(cursor), access_token=access_token)
         message = "Something went wrong!"
         recent_courses = []
+        refs = []
+        next_page = None
         if response.ok:
-            data = json.loads(response.content)
+            data = response.json()
             if len(data["data"]) == 0:
-                if keywords is not None:
+                if cursor is not None:
+                    message = "There is no more courses"
+                elif keywords is not None:
                     message = "Sorry you have not enroll any course of %s" % ', '.join(keywords)
                 else:
                     message = "Sorry you have not enroll any course yet"
             else:
                 c = ', '.join(keywords) + " " if keywords is not None else ""
-                message = f"Here are some of your {c}courses: "
-                recent_courses = list(map(lambda x: x["name"], data["data"][:3]))
-                message += ', '.join(list(map(lambda x: x["name"], data["data"][:3])))
+                message = f"Here are some {'more ' if cursor else ''}of your {c}courses: "
+                recent_courses = list(map(lambda x: x["name"], data["data"][:course_page_size]))
+                refs = list(map(course_ref, data["data"][:course_page_size]))
+                message += ', '.join(recent_courses)
+                next_page = next_page_cursor(data, ActionShowMyCourses._name(), keywords)
 
         req = PreparedRequest()
         req.prepare_url(f"{base_url}/student/courses", params)
@@ -346,16 +445,18 @@ class ActionShowMyCourses(PendingAction):
         json_message = {"text": message, "link": {"url": req.url, "title": "Show more"}}
         dispatcher.utter_message(json_message=json_message)
 
-        return [SlotSet("recent_courses", recent_courses)]
+        return [SlotSet("recent_courses", recent_courses), SlotSet("course_refs", refs),
+                SlotSet("courses_cursor", next_page)]
 
     @staticmethod
-    def condition(tracker, **kwargs):
+    async def condition(tracker, **kwargs):
         access_token = kwargs.get("access_token", None)
         condition = (access_token or tracker.get_slot("access_token")) is not None
         return condition, "OK" if condition else "Need to login"
 
 
 class ActionShowProgressCourse(PendingAction):
+    description = "show your progress in the course"
 
     def name(self) -> Text:
         return self._name()
@@ -368,35 +469,35 @@ class ActionShowProgressCourse(PendingAction):
     def get_name():
         return ActionShowProgressCourse._name()
 
+    @fail_fast
+    @timed
     async def run(
             self, dispatcher, tracker: Tracker, domain: Dict[Text, Any],
     ) -> List[Dict[Text, Any]]:
-        return self.perform(dispatcher, tracker, domain)
+        return await self.perform(dispatcher, tracker, domain)
 
     # noinspection PyUnusedLocal
     @staticmethod
-    def perform(dispatcher, tracker, domain=None, access_token=None, **kwargs):
+    @timed
+    async def perform(dispatcher, tracker, domain=None, access_token=None, **kwargs):
         # Not login yet, save pending action and login to continue
         access_token = access_token or tracker.get_slot("access_token")
         if access_token is None:
-            return [SlotSet("pending_action", ActionShowProgressCourse._name()), FollowupAction('login_form')]
+            return [*queue_pending_action(tracker, ActionShowProgressCourse._name()), FollowupAction('login_form')]
 
-        valid, course = check_valid_course(tracker)
+        valid, course = await check_valid_course(tracker)
         if not valid:
             if course is not None:
-                return [SlotSet("likely_course", course['name']),
-                        FollowupAction("utter_course_not_found_and_suggest")]
+                return [*remember_likely_course(tracker, course), FollowupAction("utter_course_not_found_and_suggest")]
             return [FollowupAction("utter_course_not_found")]
 
         params = {"course_id": course["id"]}
 
-        headers = {'Accept': 'application/json',
-                   'Authorization': f'Bearer {access_token}'}
-        response = requests.get(f"{api_url}/courses/progress", params=params, headers=headers)
+        response = await client.get("/courses/progress", params=params, access_token=access_token)
         message = "Something went wrong!"
         recent_courses = []
         if response.ok:
-            data = json.loads(response.content)["data"]
+            data = response.json()["data"]
             progress = 100.0 * data["complete"] / data["total"]
             if progress == 0:
                 message = "You have not start learning the course yet"
@@ -412,13 +513,15 @@ class ActionShowProgressCourse(PendingAction):
         return []
 
     @staticmethod
-    def condition(tracker, **kwargs):
+    async def condition(tracker, **kwargs):
         access_token = kwargs.get("access_token", None)
         condition = (access_token or tracker.get_slot("access_token")) is not None
         return condition, "OK" if condition else "Need to login"
 
 
 class ActionShowPendingCourses(PendingAction):
+    required_role = "admin"
+    description = "show the pending courses"
 
     def name(self) -> Text:
         return self._name()
@@ -431,33 +534,42 @@ class ActionShowPendingCourses(PendingAction):
     def get_name():
         return ActionShowPendingCourses._name()
 
+    @fail_fast
+    @timed
     async def run(
             self, dispatcher, tracker: Tracker, domain: Dict[Text, Any],
     ) -> List[Dict[Text, Any]]:
-        return self.perform(dispatcher, tracker, domain)
+        return await self.perform(dispatcher, tracker, domain)
 
     # noinspection PyUnusedLocal
     @staticmethod
-    def perform(dispatcher, tracker, domain=None, access_token=None, **kwargs):
+    @timed
+    async def perform(dispatcher, tracker, domain=None, access_token=None, **kwargs):
+        access_token = access_token or tracker.get_slot("access_token")
+        page = requested_page(tracker)
+        key = response_key(ActionShowPendingCourses._name(), {"page": page}, ActionShowPendingCourses.required_role)
+        cached = await response_cache.aget(key)
+        # Check role and fetch the page at the same time
+        listing = None
+        if access_token is not None and cached is None:
+            listing = client.get("/courses/pending", params=table_page_params(page), access_token=access_token)
+        (check, message), response = await gather_after_check(
+            checked_condition(ActionShowPendingCourses, tracker, access_token, kwargs), listing)
         # Not login yet, save pending action and login to continue
-        check, message = ActionShowPendingCourses.condition(tracker, access_token=access_token)
         if not check:
             dispatcher.utter_message(message)
-            return [SlotSet("pending_action", ActionShowPendingCourses._name()), FollowupAction('login_form')]
+            return [*queue_pending_action(tracker, ActionShowPendingCourses._name()), FollowupAction('login_form')]
 
-        access_token = access_token or tracker.get_slot("access_token")
-        headers = {'Accept': 'application/json',
-                   'Authorization': f'Bearer {access_token}'}
-        response = requests.get(f"{api_url}/courses/pending", headers=headers)
         message = "Something went wrong!"
         recent_courses = []
+        refs = []
         table_data = []
-        if response.ok:
-            data = json.loads(response.content)
-            if len(data["data"]) == 0:
+        page_data = cached or await cache_page(key, response, page)
+        if page_data is not None:
+            rows, has_next = page_data["rows"], page_data["has_next"]
+            if len(rows) == 0:
                 message = "Sorry there is no pending course"
             else:
-                url = f"{base_url}/courses/%s"
                 table_data = list(
                     map(lambda x: [
                         [{"data": x["name"], "class": ""}],
@@ -469,8 +581,10 @@ class ActionShowPendingCourses(PendingAction):
                                   "message": f"/approve_course{{\"course_name\": \"{x['name']}\"}}"})}
                         ]
                     ],
-                        data["data"]))
-                recent_courses = list(map(lambda x: x["name"], data["data"]))
+                        rows))
+                table_data += page_navigation(tracker, "show_pending_courses", {}, page, has_next)
+                recent_courses = list(map(lambda x: x["name"], rows))
+                refs = list(map(course_ref, rows))
                 message = f"Here are list of pending courses: "
 
         json_message = {"text": message,
@@ -478,20 +592,24 @@ class ActionShowPendingCourses(PendingAction):
                                   "data": table_data}}
         dispatcher.utter_message(json_message=json_message)
 
-        return [SlotSet("recent_courses", recent_courses)]
+        return [SlotSet("recent_courses", recent_courses), SlotSet("course_refs", refs)]
 
     @staticmethod
-    def condition(tracker, **kwargs):
+    async def condition(tracker, **kwargs):
         access_token = kwargs.get("access_token", None)
-        condition = is_admin(tracker, access_token)
+        condition = await is_admin(tracker, access_token)
         return condition, "OK" if condition else "Need to login into admin account"
 
 
 class ActionApproveCourse(PendingAction):
+    required_role = "admin"
+    description = "approve the course"
 
+    @fail_fast
+    @timed
     async def run(self, dispatcher, tracker: Tracker, domain) -> List[
         Dict[Text, Any]]:
-        return self.perform(dispatcher, tracker)
+        return await self.perform(dispatcher, tracker)
 
     def name(self):
         return self._name()
@@ -505,7 +623,8 @@ class ActionApproveCourse(PendingAction):
         return ActionApproveCourse._name()
 
     @staticmethod
-    def perform(dispatcher, tracker: Tracker, domain=None, access_token=None, **kwargs):
+    @timed
+    async def perform(dispatcher, tracker: Tracker, domain=None, access_token=None, **kwargs):
         # Get the course name user have chosen
         course_name = tracker.get_slot("likely_course") or tracker.get_slot("course_name")
         if course_name is None:
@@ -514,24 +633,25 @@ class ActionApproveCourse(PendingAction):
                 return [FollowupAction("utter_enroll_failed")]
             course_name = recent_courses[0]
         # Check if is valid course
-        data = json.loads(requests.get(f"{api_url}/similar-courses", params={"course_name": course_name}).content)[
-            "data"]
+        data = await resolve_course(course_name, use_catalog=False, tracker=tracker)
         if data["course"] is None:
             if data["extras"] is not None and len(data["extras"]) > 0:
-                likely_course = data["extras"][0]["name"]
-                return [SlotSet("likely_course", likely_course), FollowupAction("utter_course_not_found_and_suggest")]
+                return [*remember_likely_course(tracker, data["extras"][0]),
+                        FollowupAction("utter_course_not_found_and_suggest")]
 
             return [FollowupAction("utter_course_not_found")]
 
         # Not login yet, save pending action and login to continue
         access_token = access_token or tracker.get_slot("access_token")
         if access_token is None:
-            return [SlotSet("pending_action", ActionApproveCourse._name()), FollowupAction('login_form')]
+            return [*queue_pending_action(tracker, ActionApproveCourse._name()), FollowupAction('login_form')]
 
         # Enroll course
-        results = ActionApproveCourse._perform(data["course"]["id"], access_token)
+        results = await ActionApproveCourse._perform(data["course"]["id"], access_token)
+        await course_cache.ainvalidate(normalize_name(course_name))
+        await invalidate_responses(ActionShowPendingCourses.get_name())
 
-        response = json.loads(results.content)
+        response = results.json()
         # Failed
         if not results.ok or not response["success"]:
             dispatcher.utter_message(response="utter_approve_failed")
@@ -542,31 +662,33 @@ class ActionApproveCourse(PendingAction):
         return [FollowupAction("action_listen")]
 
     @staticmethod
-    def _perform(course_id, access_token):
+    async def _perform(course_id, access_token):
         # Get the course name user have chosen
         if course_id is None:
             return None
 
         # Enroll course request
-        headers = {'Accept': 'application/json',
-                   'Authorization': f'Bearer {access_token}'}
-        results = requests.put(f"{api_url}/courses/approve",
-                               data={'course_id': course_id},
-                               headers=headers)
+        results = await client.put("/courses/approve",
+                                   data={'course_id': course_id},
+                                   access_token=access_token)
         return results
 
     @staticmethod
-    def condition(tracker, **kwargs):
+    async def condition(tracker, **kwargs):
         access_token = kwargs.get("access_token", None)
-        condition = is_admin(tracker, access_token)
+        condition = await is_admin(tracker, access_token)
         return condition, "OK" if condition else "Need to login into admin account"
 
 
 class ActionAddResource(PendingAction):
+    required_role = "admin"
+    description = "add the resource"
 
+    @fail_fast
+    @timed
     async def run(self, dispatcher, tracker: Tracker, domain) -> List[
         Dict[Text, Any]]:
-        return self.perform(dispatcher, tracker)
+        return await self.perform(dispatcher, tracker)
 
     def name(self):
         return self._name()
@@ -580,13 +702,14 @@ class ActionAddResource(PendingAction):
         return ActionAddResource._name()
 
     @staticmethod
-    def perform(dispatcher, tracker: Tracker, domain=None, access_token=None, **kwargs):
+    @timed
+    async def perform(dispatcher, tracker: Tracker, domain=None, access_token=None, **kwargs):
         # Not login yet, save pending action and login to continue
         access_token = access_token or tracker.get_slot("access_token")
-        check, message = ActionAddResource.condition(tracker, access_token=access_token)
+        check, message = await checked_condition(ActionAddResource, tracker, access_token, kwargs)
         if not check:
             dispatcher.utter_message(message)
-            return [SlotSet("pending_action", ActionAddResource.get_name()), FollowupAction('login_form')]
+            return [*queue_pending_action(tracker, ActionAddResource.get_name()), FollowupAction('login_form')]
 
         resource_type = map_resource_types_to_uri.get(tracker.get_slot("resource_type"), None)
         # Get the course name user have chosen
@@ -597,9 +720,9 @@ class ActionAddResource(PendingAction):
             dispatcher.utter_message(response='utter_not_enough_info')
             return []
         # Add category
-        results = ActionAddResource._perform(resource_type, resource_name, access_token)
+        results = await ActionAddResource._perform(resource_type, resource_name, access_token)
 
-        response = json.loads(results.content)
+        response = results.json()
         # Failed
         if not results.ok or not response["success"]:
             dispatcher.utter_message(response="utter_failed")
@@ -610,31 +733,34 @@ class ActionAddResource(PendingAction):
         return [FollowupAction("action_listen")]
 
     @staticmethod
-    def _perform(resource_type, name, access_token):
+    async def _perform(resource_type, name, access_token):
         # Get the course name user have chosen
         if name is None:
             return None
 
         # Enroll course request
-        headers = {'Accept': 'application/json',
-                   'Authorization': f'Bearer {access_token}'}
-        results = requests.post(f"{api_url}/admin/{resource_type}",
-                                data={'name': name},
-                                headers=headers)
+        results = await client.post(f"/admin/{resource_type}",
+                                    data={'name': name},
+                                    access_token=access_token)
+        await invalidate_responses(ActionShowResources.get_name())
         return results
 
     @staticmethod
-    def condition(tracker, **kwargs):
+    async def condition(tracker, **kwargs):
         access_token = kwargs.get("access_token", None)
-        condition = is_admin(tracker, access_token)
+        condition = await is_admin(tracker, access_token)
         return condition, "OK" if condition else "Need to login into admin account"
 
 
 class ActionDeleteResource(PendingAction):
+    required_role = "admin"
+    description = "delete the resource"
 
+    @fail_fast
+    @timed
     async def run(self, dispatcher, tracker: Tracker, domain) -> List[
         Dict[Text, Any]]:
-        return self.perform(dispatcher, tracker)
+        return await self.perform(dispatcher, tracker)
 
     def name(self):
         return self._name()
@@ -648,28 +774,30 @@ class ActionDeleteResource(PendingAction):
         return ActionDeleteResource._name()
 
     @staticmethod
-    def perform(dispatcher, tracker: Tracker, domain=None, access_token=None, **kwargs):
+    @timed
+    async def perform(dispatcher, tracker: Tracker, domain=None, access_token=None, **kwargs):
         # Not login yet, save pending action and login to continue
         access_token = access_token or tracker.get_slot("access_token")
-        check, message = ActionDeleteResource.condition(tracker, access_token=access_token)
-        if not check:
-            dispatcher.utter_message(message)
-            return [SlotSet("pending_action", ActionDeleteResource.get_name()), FollowupAction('login_form')]
-        resource_type = map_resource_types_to_uri.get(tracker.get_slot("resource_type"), None)
         # Get the course name user have chosen
+        resource_type = map_resource_types_to_uri.get(tracker.get_slot("resource_type"), None)
         resource_name = tracker.get_slot("likely_resource") or tracker.get_slot("resource_name")
+        # Check role and if is valid resource at the same time
+        lookup = None
+        if access_token is not None and resource_name is not None and resource_type is not None:
+            lookup = find_resource(resource_type, resource_name, access_token)
+        (check, message), data = await gather_after_check(
+            checked_condition(ActionDeleteResource, tracker, access_token, kwargs), lookup)
+        if not check:
+            dispatcher.utter_message(message)
+            return [*queue_pending_action(tracker, ActionDeleteResource.get_name()), FollowupAction('login_form')]
         if resource_name is None or resource_type is None:
             if tracker.get_slot("active_loop") is None:
                 return [FollowupAction("resource_form")]
             dispatcher.utter_message(response='utter_not_enough_info')
             return []
-        headers = {'Accept': 'application/json',
-                   'Authorization': f'Bearer {access_token}'}
-        # Check if is valid course
-        data = json.loads(
-            requests.get(f"{api_url}/admin/{resource_type}/similar", params={"name": resource_name},
-                         headers=headers).content)
-        data = data["data"]
+        if data is None:
+            dispatcher.utter_message(response="utter_failed")
+            return []
         if data["resource"] is None:
             if data["extras"] is not None and len(data["extras"]) > 0:
                 likely_category = data["extras"][0]["name"]
@@ -680,9 +808,9 @@ class ActionDeleteResource(PendingAction):
             return [SlotSet("resource_not_found", resource_name), FollowupAction("utter_resource_not_found")]
 
         # Enroll course
-        results = ActionDeleteResource._perform(resource_type, resource_name, access_token)
+        results = await ActionDeleteResource._perform(resource_type, resource_name, access_token)
 
-        response = json.loads(results.content)
+        response = results.json()
         # Failed
         if not results.ok or not response["success"]:
             dispatcher.utter_message(response="utter_failed")
@@ -693,27 +821,28 @@ class ActionDeleteResource(PendingAction):
         return [FollowupAction("action_listen")]
 
     @staticmethod
-    def _perform(resource_type, name, access_token):
+    async def _perform(resource_type, name, access_token):
         # Get the course name user have chosen
         if name is None:
             return None
 
         # Enroll course request
-        headers = {'Accept': 'application/json',
-                   'Authorization': f'Bearer {access_token}'}
-        results = requests.delete(f"{api_url}/admin/{map_resource_types_to_uri.get(resource_type)}",
-                                  data={'name': name},
-                                  headers=headers)
+        results = await client.delete(f"/admin/{map_resource_types_to_uri.get(resource_type)}",
+                                      data={'name': name},
+                                      access_token=access_token)
+        await invalidate_responses(ActionShowResources.get_name())
         return results
 
     @staticmethod
-    def condition(tracker, **kwargs):
+    async def condition(tracker, **kwargs):
         access_token = kwargs.get("access_token", None)
-        condition = is_admin(tracker, access_token)
+        condition = await is_admin(tracker, access_token)
         return condition, "OK" if condition else "Need to login into admin account"
 
 
 class ActionShowResources(PendingAction):
+    required_role = "admin"
+    description = "show the resources"
 
     def name(self) -> Text:
         return self._name()
@@ -726,38 +855,49 @@ class ActionShowResources(PendingAction):
     def get_name():
         return ActionShowResources._name()
 
+    @fail_fast
+    @timed
     async def run(
             self, dispatcher, tracker: Tracker, domain: Dict[Text, Any],
     ) -> List[Dict[Text, Any]]:
-        return self.perform(dispatcher, tracker, domain)
+        return await self.perform(dispatcher, tracker, domain)
 
     # noinspection PyUnusedLocal
     @staticmethod
-    def perform(dispatcher, tracker, domain=None, access_token=None, **kwargs):
+    @timed
+    async def perform(dispatcher, tracker, domain=None, access_token=None, **kwargs):
+        access_token = access_token or tracker.get_slot("access_token")
+        resource_type = map_resource_types_to_uri.get(tracker.get_slot("resource_type"), None)
+        resource_types = map_resource_types_to_plural_uri.get(tracker.get_slot("resource_type"), None)
+        page = requested_page(tracker)
+        key = response_key(ActionShowResources._name(), {"resource_type": resource_type, "page": page},
+                           ActionShowResources.required_role)
+        cached = await response_cache.aget(key)
+        # Check role and fetch the page at the same time
+        listing = None
+        if access_token is not None and resource_type is not None and cached is None:
+            listing = client.get(f"/admin/{resource_types}", params=table_page_params(page),
+                                 access_token=access_token)
+        (check, message), response = await gather_after_check(
+            checked_condition(ActionShowResources, tracker, access_token, kwargs), listing)
         # Not login yet, save pending action and login to continue
-        check, message = ActionShowResources.condition(tracker, access_token=access_token)
         if not check:
             dispatcher.utter_message(message)
-            return [SlotSet("pending_action", ActionShowResources._name()), FollowupAction('login_form')]
+            return [*queue_pending_action(tracker, ActionShowResources._name()), FollowupAction('login_form')]
 
-        resource_type = map_resource_types_to_uri.get(tracker.get_slot("resource_type"), None)
-        resource_types = map_resource_types_to_plural_uri.get(tracker.get_slot("resource_type"), None)
         if resource_type is None:
             if tracker.get_slot("active_loop") is None:
                 return [FollowupAction("resource_form")]
             dispatcher.utter_message(response='utter_not_enough_info')
             return []
 
-        access_token = access_token or tracker.get_slot("access_token")
-        headers = {'Accept': 'application/json',
-                   'Authorization': f'Bearer {access_token}'}
-        response = requests.get(f"{api_url}/admin/{resource_types}", headers=headers)
         message = "Something went wrong!"
         recent_resources = []
         table_data = []
-        if response.ok:
-            data = json.loads(response.content)
-            if len(data["data"]) == 0:
+        page_data = cached or await cache_page(key, response, page)
+        if page_data is not None:
+            rows, has_next = page_data["rows"], page_data["has_next"]
+            if len(rows) == 0:
                 message = f"Sorry there is no {resource_types}"
             else:
                 table_data = list(
@@ -775,8 +915,10 @@ class ActionShowResources(PendingAction):
                                   "message": f"/delete_resource{{\"resource_name\": \"{x['name']}\"}}"})}
                         ]
                     ],
-                        data["data"]))
-                recent_resources = list(map(lambda x: x["name"], data["data"]))
+                        rows))
+                table_data += page_navigation(tracker, "show_resources",
+                                              {"resource_type": tracker.get_slot("resource_type")}, page, has_next)
+                recent_resources = list(map(lambda x: x["name"], rows))
                 message = f"Here are list of {resource_types}: "
 
         json_message = {"text": message,
@@ -787,17 +929,21 @@ class ActionShowResources(PendingAction):
         return [SlotSet("recent_resources", recent_resources)]
 
     @staticmethod
-    def condition(tracker, **kwargs):
+    async def condition(tracker, **kwargs):
         access_token = kwargs.get("access_token", None)
-        condition = is_admin(tracker, access_token)
+        condition = await is_admin(tracker, access_token)
         return condition, "OK" if condition else "Need to login into admin account"
 
 
 class ActionEditResource(PendingAction):
+    required_role = "admin"
+    description = "edit the resource"
 
+    @fail_fast
+    @timed
     async def run(self, dispatcher, tracker: Tracker, domain) -> List[
         Dict[Text, Any]]:
-        return self.perform(dispatcher, tracker)
+        return await self.perform(dispatcher, tracker)
 
     def name(self):
         return self._name()
@@ -811,28 +957,30 @@ class ActionEditResource(PendingAction):
         return ActionEditResource._name()
 
     @staticmethod
-    def perform(dispatcher, tracker: Tracker, domain=None, access_token=None, **kwargs):
+    @timed
+    async def perform(dispatcher, tracker: Tracker, domain=None, access_token=None, **kwargs):
         # Not login yet, save pending action and login to continue
         access_token = access_token or tracker.get_slot("access_token")
-        check, message = ActionEditResource.condition(tracker, access_token=access_token)
-        if not check:
-            dispatcher.utter_message(message)
-            return [SlotSet("pending_action", ActionEditResource.get_name()), FollowupAction('login_form')]
         # Get the course name user have chosen
         resource_type = map_resource_types_to_uri.get(tracker.get_slot("resource_type"), None)
         resource_name = tracker.get_slot("likely_resource") or tracker.get_slot("resource_name")
+        # Check role and if is valid resource at the same time
+        lookup = None
+        if access_token is not None and resource_name is not None and resource_type is not None:
+            lookup = find_resource(resource_type, resource_name, access_token)
+        (check, message), data = await gather_after_check(
+            checked_condition(ActionEditResource, tracker, access_token, kwargs), lookup)
+        if not check:
+            dispatcher.utter_message(message)
+            return [*queue_pending_action(tracker, ActionEditResource.get_name()), FollowupAction('login_form')]
         if resource_name is None or resource_type is None:
             if tracker.get_slot("active_loop") is None:
                 return [FollowupAction("edit_resource_form")]
             dispatcher.utter_message(response='utter_not_enough_info')
             return []
-        headers = {'Accept': 'application/json',
-                   'Authorization': f'Bearer {access_token}'}
-        # Check if is valid course
-        data = json.loads(
-            requests.get(f"{api_url}/admin/{resource_type}/similar", params={"name": resource_name},
-                         headers=headers).content)
-        data = data["data"]
+        if data is None:
+            dispatcher.utter_message(response="utter_failed")
+            return []
         if data["resource"] is None:
             if data["extras"] is not None and len(data["extras"]) > 0:
                 likely_category = data["extras"][0]["name"]
@@ -842,11 +990,11 @@ class ActionEditResource(PendingAction):
 
             return [SlotSet("resource_not_found", resource_name), FollowupAction("utter_resource_not_found")]
         # Add category
-        results = ActionEditResource._perform(resource_type, data["resource"]["id"],
-                                              tracker.get_slot("new_resource_name"),
-                                              access_token)
+        results = await ActionEditResource._perform(resource_type, data["resource"]["id"],
+                                                    tracker.get_slot("new_resource_name"),
+                                                    access_token)
 
-        response = json.loads(results.content)
+        response = results.json()
         # Failed
         if not results.ok or not response["success"]:
             dispatcher.utter_message(response="utter_failed")
@@ -857,27 +1005,28 @@ class ActionEditResource(PendingAction):
         return [FollowupAction("action_listen")]
 
     @staticmethod
-    def _perform(resource_type, resource_id, new_name, access_token):
+    async def _perform(resource_type, resource_id, new_name, access_token):
         # Get the course name user have chosen
         if resource_id is None:
             return None
 
         # Enroll course request
-        headers = {'Accept': 'application/json',
-                   'Authorization': f'Bearer {access_token}'}
-        results = requests.post(f"{api_url}/admin/{resource_type}",
-                                data={'id': resource_id, 'name': new_name},
-                                headers=headers)
+        results = await client.post(f"/admin/{resource_type}",
+                                    data={'id': resource_id, 'name': new_name},
+                                    access_token=access_token)
+        await invalidate_responses(ActionShowResources.get_name())
         return results
 
     @staticmethod
-    def condition(tracker, **kwargs):
+    async def condition(tracker, **kwargs):
         access_token = kwargs.get("access_token", None)
-        condition = is_admin(tracker, access_token)
+        condition = await is_admin(tracker, access_token)
         return condition, "OK" if condition else "Need to login into admin account"
 
 
 class ActionShowCourseStatistic(PendingAction):
+    required_role = "author"
+    description = "show your courses statistic"
 
     def name(self) -> Text:
         return self._name()
@@ -890,28 +1039,33 @@ class ActionShowCourseStatistic(PendingAction):
     def get_name():
         return ActionShowCourseStatistic._name()
 
+    @fail_fast
+    @timed
     async def run(
             self, dispatcher, tracker: Tracker, domain: Dict[Text, Any],
     ) -> List[Dict[Text, Any]]:
-        return self.perform(dispatcher, tracker, domain)
+        return await self.perform(dispatcher, tracker, domain)
 
     # noinspection PyUnusedLocal
     @staticmethod
-    def perform(dispatcher, tracker, domain=None, access_token=None, **kwargs):
+    @timed
+    async def perform(dispatcher, tracker, domain=None, access_token=None, **kwargs):
+        access_token = access_token or tracker.get_slot("access_token")
+        # Check role and fetch the statistic at the same time
+        listing = None
+        if access_token is not None:
+            listing = client.get("/author/courses/statistic", access_token=access_token)
+        (check, message), response = await gather_after_check(
+            checked_condition(ActionShowCourseStatistic, tracker, access_token, kwargs), listing)
         # Not login yet, save pending action and login to continue
-        check, message = ActionShowCourseStatistic.condition(tracker, access_token=access_token)
         if not check:
             dispatcher.utter_message(message)
-            return [SlotSet("pending_action", ActionShowCourseStatistic._name()), FollowupAction('login_form')]
+            return [*queue_pending_action(tracker, ActionShowCourseStatistic._name()), FollowupAction('login_form')]
 
-        access_token = access_token or tracker.get_slot("access_token")
-        headers = {'Accept': 'application/json',
-                   'Authorization': f'Bearer {access_token}'}
-        response = requests.get(f"{api_url}/author/courses/statistic", headers=headers)
         message = "Something went wrong!"
         table_data = []
         if response.ok:
-            data = json.loads(response.content)
+            data = response.json()
             if len(data["data"]) == 0:
                 message = f"Sorry you have not create any course yet"
             else:
@@ -934,57 +1088,58 @@ class ActionShowCourseStatistic(PendingAction):
         return []
 
     @staticmethod
-    def condition(tracker, **kwargs):
+    async def condition(tracker, **kwargs):
         access_token = kwargs.get("access_token", None)
-        condition = is_author(tracker, access_token)
+        condition = await is_author(tracker, access_token)
         return condition, "OK" if condition else "Need to login into author or admin account"
 
 
 pending_action_class = [EnrollCourse, ActionShowMyCourses, ActionShowProgressCourse, ActionShowPendingCourses,
                         ActionApproveCourse, ActionAddResource, ActionDeleteResource, ActionEditResource,
                         ActionShowResources, ActionShowCourseStatistic]
+pending_action_registry = {action_cls.get_name(): action_cls for action_cls in pending_action_class}
 
 
 class ActionAccessAndPerform(Action):
 
+    @fail_fast
+    @timed
     async def run(self, dispatcher, tracker: Tracker, domain) -> List[
         Dict[Text, Any]]:
         user = tracker.get_slot("email")
         password = tracker.get_slot("password")
         if user is None or password is None:
             return [FollowupAction("login_form")]
-        results = requests.post(f"{api_url}/login",
-                                data={'email': user, 'password': password})
+        results = await client.post("/login",
+                                    data={'email': user, 'password': password})
         if not results.ok:
             dispatcher.utter_message("Please enter valid information")
             return [ActionReverted(), AllSlotsReset()]
 
-        response = json.loads(results.content)
-        if not response["success"]:
+        json_res = results.json()
+        if not json_res["success"]:
             dispatcher.utter_message("These credentials do not match our records.")
             return [ActionReverted(), AllSlotsReset()]
 
-        json_res = json.loads(results.content)
         name = json_res["data"]["name"]
         # personal access token for later request
         access_token = json_res["data"]["token"]
-
-        pending_action = tracker.get_slot("pending_action")
-        if pending_action is not None:
-            # Not satisfy condition to perform pending action, keep login
-            check, message = self.check_pending_action_condition(tracker, pending_action, access_token)
-            if not check:
-                dispatcher.utter_message(message)
-                if tracker.get_slot("active_loop") is None:
-                    return [FollowupAction("login_form")]
-                # Reset form and login again into admin account
-                return [SlotSet("active_loop", None), SlotSet("requested_slot", None), SlotSet("email", None),
-                        SlotSet("password", None),
-                        FollowupAction("login_form")]
-
-            res = self.perform_pending_action(dispatcher, tracker, domain, access_token, pending_action)
-
-            return [SlotSet("access_token", access_token), SlotSet("name", name), SlotSet("pending_action", None), *res]
+        # Login again replaces the previous session of the conversation
+        previous_token = tracker.get_slot("access_token")
+        if previous_token is not None and previous_token != access_token:
+            await forget_roles(previous_token)
+        await remember_roles(access_token, json_res["data"])
+
+        pending_actions = pending_queue(tracker)
+        if len(pending_actions) > 0:
+            login = [SlotSet("access_token", access_token), SlotSet("name", name), SlotSet("pending_action", None),
+                     SlotSet("pending_actions", None)]
+            try:
+                return await self.check_and_perform(dispatcher, tracker, domain, access_token, pending_actions, login)
+            except (ServiceUnavailable, asyncio.TimeoutError):
+                # Keep the login, the user asks again once the service is back
+                dispatcher.utter_message(response="utter_service_busy")
+                return login
 
         template = "utter_access"
         if access_token is not None:
@@ -995,23 +1150,125 @@ class ActionAccessAndPerform(Action):
     def name(self):
         return 'action_access_and_perform'
 
+    async def check_and_perform(self, dispatcher, tracker, domain, access_token, pending_actions, login):
+        """
+        Check the conditions of the queued actions and perform the allowed ones
+        :param login: events of the login
+        :return: events of the login and the actions, or of a new login when no action is allowed
+        """
+        checks = await self.check_pending_action_conditions(tracker, pending_actions, access_token)
+        allowed = [pending_action for pending_action, (check, _) in zip(pending_actions, checks) if check]
+        for pending_action, (check, message) in zip(pending_actions, checks):
+            if not check:
+                dispatcher.utter_message(f"Sorry, I can not {describe(pending_action)}: {message}")
+        # Not satisfy condition to perform any pending action, keep login
+        if len(allowed) == 0:
+            if tracker.get_slot("active_loop") is None:
+                return [FollowupAction("login_form")]
+            # Reset form and login again into admin account
+            return [SlotSet("active_loop", None), SlotSet("requested_slot", None), SlotSet("email", None),
+                    SlotSet("password", None),
+                    FollowupAction("login_form")]
+
+        res = await self.perform_pending_actions(dispatcher, tracker, domain, access_token, allowed)
+
+        return [*login, *res]
+
     @staticmethod
-    def perform_pending_action(dispatcher, tracker, domain, access_token, pending_action):
-        for action_cls in pending_action_class:
-            if pending_action == action_cls.get_name():
-                return action_cls.perform(dispatcher=dispatcher, tracker=tracker, domain=domain,
-                                          access_token=access_token)
-        return []
+    async def perform_pending_actions(dispatcher, tracker, domain, access_token, pending_actions):
+        """
+        Perform the queued actions in order. The follow-up response of an action which is not the last one is
+        uttered at once. An action which follows up with a form stops the queue: the form changes the slots the next
+        actions depend on, so they are dropped and the user is asked to ask for them again
+        :param pending_actions: names of the actions, their conditions are checked
+        :return: events of the actions
+        """
+        events = []
+        for i, pending_action in enumerate(pending_actions):
+            action_cls = pending_action_registry.get(pending_action)
+            if action_cls is None:
+                continue
+            res = await action_cls.perform(dispatcher=dispatcher, tracker=tracker, domain=domain,
+                                           access_token=access_token, checked=True)
+            if i == len(pending_actions) - 1:
+                return events + res
+            followup = next((event["name"] for event in res if event.get("event") == "followup"), None)
+            events += [event for event in res if event.get("event") != "followup"]
+            if followup is not None and followup.startswith("utter_"):
+                dispatcher.utter_message(response=followup)
+            elif followup is not None and followup != "action_listen":
+                rest = ", ".join(describe(action) for action in pending_actions[i + 1:])
+                dispatcher.utter_message(f"Please ask me again to {rest} afterwards")
+                return events + [FollowupAction(followup)]
+        return events
 
     @staticmethod
-    def check_pending_action_condition(tracker, pending_action, access_token=None):
-        for action_cls in pending_action_class:
-            if pending_action == action_cls.get_name():
-                return action_cls.condition(tracker=tracker, access_token=access_token)
-        return False, "Invalid action"
+    async def check_pending_action_conditions(tracker, pending_actions, access_token=None):
+        """
+        Check the conditions of the queued actions, the roles they need are fetched at once
+        :param tracker: tracker of conversation
+        :param pending_actions: names of the actions
+        :param access_token: the token after login
+        :return: list of check, message in the same order
+        """
+        classes = [pending_action_registry.get(pending_action) for pending_action in pending_actions]
+        roles = {action_cls.required_role for action_cls in classes
+                 if action_cls is not None and action_cls.required_role is not None}
+        await gather_with_deadline(*[has_role(role, access_token) for role in roles])
+        return [await action_cls.condition(tracker=tracker, access_token=access_token) if action_cls is not None
+                else (False, "Invalid action") for action_cls in classes]
+
+
+def pending_queue(tracker):
+    """
+    Get the actions waiting for a login, in the order they were asked
+    :param tracker: tracker of conversation
+    :return: list of action names, the first one is also in the pending_action slot
+    """
+    queue = list(tracker.get_slot("pending_actions") or [])
+    pending_action = tracker.get_slot("pending_action")
+    if pending_action is not None and pending_action not in queue:
+        queue.insert(0, pending_action)
+    return queue
+
+
+def describe(action_name):
+    """
+    Tell what a pending action does
+    :param action_name: name of the action
+    :return: description of the action, its name if it has none
+    """
+    action_cls = pending_action_registry.get(action_name)
+    if action_cls is None or action_cls.description is None:
+        return action_name
+    return action_cls.description
+
+
+def queue_pending_action(tracker, action_name):
+    """
+    Queue an action to perform after login
+    :param tracker: tracker of conversation
+    :param action_name: name of the action
+    :return: events setting pending_action (the first queued action) and pending_actions
+    """
+    queue = pending_queue(tracker)
+    if action_name not in queue:
+        queue = (queue + [action_name])[-pending_queue_size:]
+    return [SlotSet("pending_action", queue[0]), SlotSet("pending_actions", queue)]
+
+
+async def checked_condition(action_cls, tracker, access_token, kwargs):
+    """
+    Check the condition of a pending action unless it was checked before perform (checked keyword argument)
+    :return: check, message
+    """
+    if kwargs.get("checked"):
+        return True, "OK"
+    return await action_cls.condition(tracker, access_token=access_token)
 
 
-def check_valid_course(tracker):
+@timed
+async def check_valid_course(tracker):
     """
     Check if a course name in tracker is valid
     :param tracker: tracker of conversation
@@ -1025,8 +1282,7 @@ def check_valid_course(tracker):
             return False, None
         course_name = recent_courses[0]
     # Check if is valid course
-    data = json.loads(requests.get(f"{api_url}/similar-courses", params={"course_name": course_name}).content)[
-        "data"]
+    data = await resolve_course(course_name, tracker=tracker)
     if data["course"] is None:
         if data["extras"] is not None and len(data["extras"]) > 0:
             likely_course = data["extras"][0]
@@ -1037,7 +1293,88 @@ def check_valid_course(tracker):
     return True, data["course"]
 
 
-def is_admin(tracker, access_token=None):
+@timed
+async def resolve_course(course_name, use_catalog=True, tracker=None, required_fields=("id",)):
+    """
+    Find a course by name with the courses the conversation has seen (course_refs slot), an exact hit of the
+    catalog index or /similar-courses, results of /similar-courses are cached by normalized course name
+    :param course_name: name of the course
+    :param use_catalog: False to skip the catalog index, which only has the published courses
+    :param tracker: tracker of conversation, None to skip the course_refs slot
+    :param required_fields: fields the caller needs, a remembered course without them is resolved again
+    :return: dict with the course (None if not found) and extras (the courses with similar name)
+    :raise ServiceUnavailable: when /similar-courses fails and the catalog index has no suggestion
+    """
+    if tracker is not None:
+        ref = find_course_ref(tracker, course_name)
+        if ref is not None and all(field in ref for field in required_fields):
+            return {"course": ref, "extras": []}
+    if use_catalog and catalog.enabled:
+        data = catalog.lookup(course_name)
+        if data is not None:
+            return data
+    key = normalize_name(course_name)
+    data = await course_cache.aget(key)
+    if data is None:
+        try:
+            response = await client.get("/similar-courses", params={"course_name": course_name})
+            # An error body has no data, it is neither parsed nor cached
+            if not response.ok:
+                raise ServiceUnavailable("catalog", f"/similar-courses answered {response.status}")
+        except ServiceUnavailable:
+            # The catalog index can still suggest similar courses
+            data = catalog.suggest(course_name) if use_catalog and catalog.enabled else None
+            if data is None:
+                raise
+            return data
+        data = response.json()["data"]
+        await course_cache.aset(key, data)
+    return data
+
+
+def course_ref(course):
+    """
+    Compact reference of a course kept in the course_refs slot
+    :param course: course of a listing or of /similar-courses
+    :return: dict with the id, name and price (only if the course has it)
+    """
+    ref = {"id": course["id"], "name": course["name"]}
+    if "price" in course:
+        ref["price"] = course["price"]
+    return ref
+
+
+def find_course_ref(tracker, course_name):
+    """
+    Find a course the conversation has seen by name
+    :param tracker: tracker of conversation
+    :param course_name: name of the course
+    :return: the course reference or None
+    """
+    key = normalize_name(course_name)
+    for ref in tracker.get_slot("course_refs") or []:
+        if normalize_name(ref["name"]) == key:
+            return ref
+    return None
+
+
+def remember_likely_course(tracker, course):
+    """
+    Suggest a course and remember its reference so the next turn can use it without resolving its name
+    :param tracker: tracker of conversation
+    :param course: the suggested course
+    :return: events setting likely_course and course_refs (only if the course has an id)
+    """
+    # Suggestions of /similar-courses may only have a name, the next turn resolves it again
+    if "id" not in course:
+        return [SlotSet("likely_course", course["name"])]
+    ref = course_ref(course)
+    refs = [ref] + [x for x in tracker.get_slot("course_refs") or [] if x["id"] != ref["id"]]
+    return [SlotSet("likely_course", ref["name"]), SlotSet("course_refs", refs[:course_refs_size])]
+
+
+@timed
+async def is_admin(tracker, access_token=None):
     """
     Check if a course name in tracker is valid
     :param tracker: tracker of conversation
@@ -1047,17 +1384,11 @@ def is_admin(tracker, access_token=None):
     access_token = access_token or tracker.get_slot("access_token")
     if access_token is None:
         return False
-    # Check if is valid course
-    headers = {'Accept': 'application/json',
-               'Authorization': f'Bearer {access_token}'}
-    data = json.loads(requests.get(f"{api_url}/is-admin", headers=headers).content)["data"]
-    if data:
-        return True
+    return await has_role("admin", access_token)
 
-    return False
 
-
-def is_author(tracker, access_token=None):
+@timed
+async def is_author(tracker, access_token=None):
     """
     Check if a course name in tracker is valid
     :param tracker: tracker of conversation
@@ -1067,17 +1398,249 @@ def is_author(tracker, access_token=None):
     access_token = access_token or tracker.get_slot("access_token")
     if access_token is None:
         return False
-    # Check if is valid course
-    headers = {'Accept': 'application/json',
-               'Authorization': f'Bearer {access_token}'}
-    data = json.loads(requests.get(f"{api_url}/is-author", headers=headers).content)["data"]
-    if data:
-        return True
+    return await has_role("author", access_token)
+
+
+async def has_role(role, access_token):
+    """
+    Check if the user of an access token has a role, roles are cached by access token
+    :param role: admin or author
+    :param access_token: the token after login
+    :return: bool
+    :raise ServiceUnavailable: when the API fails to answer
+    """
+    roles = await role_cache.aget(access_token) or {}
+    if role not in roles:
+        response = await client.get(f"/is-{role}", access_token=access_token)
+        if response.status >= 500:
+            raise ServiceUnavailable("auth", f"/is-{role} answered {response.status}")
+        # A refused token does not have the role either, it is cached so the condition is not requested again
+        has = response.ok and bool(response.json()["data"])
+        # Read again, the other roles may have been fetched at the same time
+        roles = {**(await role_cache.aget(access_token) or {}), role: has}
+        await role_cache.aset(access_token, roles)
+    return roles[role]
 
-    return False
+
+client.unauthorized_handlers.append(forget_roles)
+
+
+def page_params(cursor=None):
+    """
+    Query params to fetch only one page of a course listing
+    :param cursor: cursor of the page, None for the first page
+    :return: dict of params
+    """
+    params = {"limit": course_page_size, "fields[]": course_list_fields}
+    if cursor is not None:
+        params["cursor"] = cursor
+    return params
+
+
+def next_page_cursor(data, action, keywords):
+    """
+    Get the value of courses_cursor slot to continue a course listing
+    :param data: response of the listing
+    :param action: name of the action which show the listing
+    :param keywords: keywords of the listing
+    :return: dict or None if there is no next page
+    """
+    cursor = data.get("next_cursor") or data.get("meta", {}).get("next_cursor")
+    if cursor is None:
+        return None
+    return {"action": action, "keywords": keywords, "cursor": cursor}
+
+
+async def gather_with_deadline(*lookups, deadline=None):
+    """
+    Run independent backend lookups concurrently so the turn waits for the slowest one instead of the sum
+    :param lookups: coroutines, a None lookup is skipped and gives None
+    :param deadline: seconds to wait for all the lookups, default is action_deadline
+    :return: list of the results in the same order
+    """
+    running = [lookup for lookup in lookups if lookup is not None]
+    results = iter(await asyncio.wait_for(asyncio.gather(*running), deadline or action_deadline))
+    return [next(results) if lookup is not None else None for lookup in lookups]
+
+
+async def gather_after_check(condition, *lookups, deadline=None):
+    """
+    Run the lookups of an action concurrently with its condition. The lookups only matter when the condition passes,
+    otherwise they are cancelled and their errors ignored so the user is asked to login instead of being told that
+    the service is busy
+    :param condition: coroutine of the condition, gives check, message
+    :param lookups: coroutines, a None lookup is skipped and gives None
+    :param deadline: seconds to wait for the condition and the lookups, default is action_deadline
+    :return: list of check, message and the results of the lookups (None if the condition failed)
+    """
+    ends_at = time.monotonic() + (deadline or action_deadline)
+    tasks = [asyncio.ensure_future(lookup) if lookup is not None else None for lookup in lookups]
+    running = [task for task in tasks if task is not None]
+    try:
+        check, message = await asyncio.wait_for(condition, ends_at - time.monotonic())
+        if not check:
+            return [(check, message), *[None] * len(lookups)]
+        results = iter(await asyncio.wait_for(asyncio.gather(*running), max(ends_at - time.monotonic(), 0)))
+    finally:
+        for task in running:
+            task.cancel()
+        # Retrieve the errors of the cancelled lookups
+        await asyncio.gather(*running, return_exceptions=True)
+    return [(check, message), *[next(results) if task is not None else None for task in tasks]]
+
+
+async def find_resource(resource_type, resource_name, access_token):
+    """
+    Find an admin resource by name
+    :param resource_type: uri of the resource type
+    :param resource_name: name of the resource
+    :param access_token: the token after login
+    :return: dict with the resource (None if not found) and extras (the resources with similar name), None if failed
+    """
+    response = await client.get(f"/admin/{resource_type}/similar", params={"name": resource_name},
+                                access_token=access_token)
+    if not response.ok:
+        return None
+    return response.json()["data"]
+
+
+def requested_page(tracker):
+    """
+    Get the table page requested by the latest message (page entity of the previous/next buttons)
+    :param tracker: tracker of conversation
+    :return: page number, start from 1
+    """
+    for entity in tracker.latest_message.get("entities", []):
+        if entity["entity"] == "page":
+            try:
+                return max(int(entity["value"]), 1)
+            except (TypeError, ValueError):
+                return 1
+    return 1
+
+
+def table_page_params(page):
+    return {"page": page, "per_page": table_page_size, "fields[]": table_fields}
+
+
+def paginate(response, page):
+    """
+    Get the rows of a table page with only the fields of the table. Paginated responses are used as is, a full list
+    is sliced and when it is large only decoded up to the page
+    :param response: response of the listing
+    :param page: page number
+    :return: rows of the page and if there is a next page
+    """
+    start = (page - 1) * table_page_size
+    if response.streamable:
+        # A large body is the full list, a server side page is never that large
+        rows = response.items(start, start + table_page_size + 1, fields=table_fields)
+        return rows[:table_page_size], len(rows) > table_page_size
+    data = response.json()
+    meta = data.get("meta") or data
+    if "current_page" in meta:
+        has_next = meta.get("current_page", page) < meta.get("last_page", page)
+        return response.items(0, table_page_size, fields=table_fields), has_next
+    has_next = len(data["data"]) > start + table_page_size
+    return response.items(start, start + table_page_size, fields=table_fields), has_next
+
+
+async def cache_page(key, response, page):
+    """
+    Get a table page from a listing response and cache it
+    :param key: key of the page in the response cache
+    :param response: response of the listing
+    :param page: page number
+    :return: dict with the rows and if there is a next page, None if the listing failed
+    """
+    if response is None or not response.ok:
+        return None
+    rows, has_next = paginate(response, page)
+    page_data = {"rows": rows, "has_next": has_next}
+    await response_cache.aset(key, page_data)
+    return page_data
+
+
+def page_navigation(tracker, intent, entities, page, has_next):
+    """
+    Build the table row with previous/next buttons
+    :param tracker: tracker of conversation
+    :param intent: intent to send with the page
+    :param entities: other entities to send with the page
+    :param page: current page number
+    :param has_next: if there is a next page
+    :return: list with the navigation row or an empty list if there is only one page
+    """
+    buttons = []
+    if page > 1:
+        buttons.append({"data": "Previous", "class": "text-center",
+                        "json_payload": json.dumps({"sender": tracker.sender_id,
+                                                    "message": f"/{intent}{json.dumps({**entities, 'page': page - 1})}"})})
+    if has_next:
+        buttons.append({"data": "Next", "class": "text-center",
+                        "json_payload": json.dumps({"sender": tracker.sender_id,
+                                                    "message": f"/{intent}{json.dumps({**entities, 'page': page + 1})}"})})
+    if len(buttons) == 0:
+        return []
+    return [[[{"data": f"Page {page}", "class": ""}], buttons]]
 
 
 def default(value, other):
     if value is not None:
         return value
     return other
+
+
+# Set by warm_up, the readiness endpoint of actions.server reports a worker ready once it is done
+warm_up_state = {"done": False, "self_check": False}
+
+register(Gauges("ilearning_actions_ready", "1 once the worker is warmed up, and if the ILearning API self-check passed",
+                ["kind"], lambda: {(kind, ): int(value) for kind, value in warm_up_state.items()}))
+
+
+@timed
+async def warm_up():
+    """
+    Warm up a worker before it gets traffic: open the connections of the ILearning API pool with the first page
+    of the course listing (the self-check, retried until warmup timeout), load the course catalog index and,
+    with a warmup access token, the first pages of the pending courses and resources tables
+    :return: True if the self-check passed
+    """
+    settings = config["warmup"]
+    deadline = time.monotonic() + settings["timeout"]
+    while not warm_up_state["self_check"] and time.monotonic() < deadline:
+        warm_up_state["self_check"] = await client.warm_up("/courses", page_params(), settings["connections"])
+        if not warm_up_state["self_check"]:
+            await asyncio.sleep(1)
+    if not warm_up_state["self_check"]:
+        logger.warning("ILearning API self-check failed, starting cold")
+
+    if catalog.enabled:
+        catalog.ensure_started()
+        while not catalog.loaded and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+    access_token = settings["access_token"]
+    if access_token is not None and warm_up_state["self_check"]:
+        tables = [(ActionShowPendingCourses, {"page": 1}, "/courses/pending")]
+        for resource_type, uri in map_resource_types_to_uri.items():
+            tables.append((ActionShowResources, {"resource_type": uri, "page": 1},
+                           f"/admin/{map_resource_types_to_plural_uri[resource_type]}"))
+        try:
+            # A page is cached for the role of its table, only the tables of the roles of the token are loaded
+            roles = list({action_cls.required_role for action_cls, _, _ in tables})
+            allowed = dict(zip(roles, await gather_with_deadline(*[has_role(role, access_token) for role in roles])))
+            pages = [(response_key(action_cls.get_name(), slots, action_cls.required_role), path)
+                     for action_cls, slots, path in tables if allowed[action_cls.required_role]]
+            responses = await gather_with_deadline(
+                *[client.get(path, params=table_page_params(1), access_token=access_token) for _, path in pages],
+                deadline=max(deadline - time.monotonic(), 1))
+        except (ServiceUnavailable, asyncio.TimeoutError) as e:
+            logger.warning(f"Can not preload the admin tables: {e!r}")
+        else:
+            for (key, _), response in zip(pages, responses):
+                await cache_page(key, response, 1)
+
+    warm_up_state["done"] = True
+    logger.info(f"Warm up done, {len(catalog)} courses in the catalog index")
+    return warm_up_state["self_check"]
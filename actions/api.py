@@ -0,0 +1,361 @@
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from itertools import islice
+from typing import Any, Dict, List, Optional, Sequence, Text, Tuple
+
+import aiohttp
+
+from . import metrics
+from .cache import TTLCache
+from .config import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+base_url = config["url"]
+api_url = f"{base_url}/api"
+
+# Endpoint groups share a circuit breaker, the longest matching path prefix wins and catalog is the default group
+endpoint_groups = {
+    "/login": "auth",
+    "/register": "auth",
+    "/is-admin": "auth",
+    "/is-author": "auth",
+    "/admin": "admin",
+    "/author": "admin",
+    "/courses/pending": "admin",
+    "/courses/approve": "admin",
+}
+
+# Statuses of the responses of the API requests made in the current task when set to a list (used by actions.batch
+# to tell if the action of a job got its data)
+response_statuses = contextvars.ContextVar("response_statuses", default=None)
+
+
+class ServiceUnavailable(Exception):
+    """
+    The ILearning API can not be reached, or its circuit breaker is open
+    """
+
+    def __init__(self, group: Text, reason: Text):
+        super().__init__(f"ILearning API {group} endpoints unavailable: {reason}")
+        self.group = group
+
+
+class CircuitBreaker:
+    """
+    Open after failure_threshold consecutive failures, then let one probe request through every reset_timeout seconds
+    (half open) until a probe succeed
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: Text, failure_threshold: int = 5, reset_timeout: float = 30, timer=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timer = timer
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and self.timer() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            return True
+        if self.state == self.CLOSED:
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit breaker {self.name} closed")
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit breaker {self.name} opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = self.timer()
+
+    def snapshot(self) -> Dict[Text, Any]:
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+def loads(content: bytes):
+    """
+    Decode a JSON body, with orjson when it is installed
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def project(item: Dict[Text, Any], fields: Optional[Sequence[Text]]) -> Dict[Text, Any]:
+    if fields is None:
+        return item
+    return {field: item[field] for field in fields if field in item}
+
+
+class ApiResponse:
+    """
+    Response of an ILearning API call, fully read so it can be used after the connection went back to the pool
+    """
+
+    def __init__(self, status: int, content: bytes, stream_threshold: Optional[int] = None):
+        self.status = status
+        self.content = content
+        self.stream_threshold = stream_threshold
+        self._json = None
+
+    @property
+    def ok(self):
+        return self.status < 400
+
+    def json(self):
+        # Parsed once, a coalesced response is shared by all its callers which must not modify it
+        if self._json is None:
+            self._json = loads(self.content)
+        return self._json
+
+    @property
+    def streamable(self) -> bool:
+        """
+        True if the body is large enough to decode the items of its data array lazily instead of parsing it
+        """
+        return (ijson is not None and self._json is None and self.stream_threshold is not None
+                and len(self.content) >= self.stream_threshold)
+
+    def items(self, start: int = 0, stop: Optional[int] = None,
+              fields: Optional[Sequence[Text]] = None) -> List[Dict[Text, Any]]:
+        """
+        Get a slice of the data array with only some fields. A large body is decoded lazily and only up to the
+        last item of the slice, a small or already parsed body is parsed once
+        :param start: index of the first item
+        :param stop: index after the last item, None for the end of the array
+        :param fields: fields to keep, None for all
+        :return: list of the items
+        """
+        if self.streamable:
+            items = ijson.items(self.content, "data.item", use_float=True)
+        else:
+            items = self.json()["data"]
+        return [project(item, fields) for item in islice(items, start, stop)]
+
+
+def encode_fields(fields: Optional[Dict[Text, Any]]) -> Optional[List[Tuple[Text, Text]]]:
+    """
+    Flatten query params or form data the way requests does: lists are repeated keys and None values are dropped
+    :param fields: dict of params or form fields
+    :return: list of key value pairs
+    """
+    if fields is None:
+        return None
+    result = []
+    for key, values in fields.items():
+        if values is None:
+            continue
+        if isinstance(values, (str, bytes)) or not hasattr(values, '__iter__'):
+            values = [values]
+        for value in values:
+            if value is not None:
+                result.append((key, str(value)))
+    return result
+
+
+class ILearningClient:
+    """
+    Async client for the ILearning API. The session and its keep-alive connection pool are shared by all actions
+    of a worker process, so pool_size is the number of connections per worker
+    """
+
+    def __init__(self, url: Text = api_url, pool_size: int = 100, keepalive_timeout: float = 30,
+                 timeouts: Optional[Dict[Text, Dict[Text, float]]] = None,
+                 breaker: Optional[Dict[Text, Any]] = None, stream_threshold: Optional[int] = None):
+        self.api_url = url
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.timeouts = timeouts or {"default": {"connect": 3, "read": 10}}
+        # Bodies of at least stream_threshold bytes have their data array decoded lazily by ApiResponse.items
+        self.stream_threshold = stream_threshold
+        breaker = breaker or {}
+        self.breakers = {group: CircuitBreaker(group, breaker.get("failure_threshold", 5),
+                                               breaker.get("reset_timeout", 30))
+                         for group in ("catalog", "auth", "admin")}
+        # Last good response of public GET requests, served while their endpoints are unavailable
+        self.stale = TTLCache(breaker.get("stale_size", 1024), breaker.get("stale_ttl", 600))
+        # Identical GET requests in flight share one request
+        self._inflight = {}
+        self.singleflight_stats = {"requests": 0, "coalesced": 0}
+        # Called with the access token when the API answers 401 to an authenticated request
+        self.unauthorized_handlers = []
+        self._session = None
+        self._loop = None
+
+    @classmethod
+    def from_config(cls, conf: Dict[Text, Any]) -> "ILearningClient":
+        return cls(f"{conf['url']}/api", pool_size=conf["pool_size"], keepalive_timeout=conf["keepalive_timeout"],
+                   timeouts=conf["timeouts"], breaker=conf["breaker"], stream_threshold=conf["stream_threshold"])
+
+    @staticmethod
+    def group(path: Text) -> Text:
+        prefixes = [prefix for prefix in endpoint_groups if path.startswith(prefix)]
+        return endpoint_groups[max(prefixes, key=len)] if prefixes else "catalog"
+
+    def breaker_states(self) -> Dict[Text, Dict[Text, Any]]:
+        return {group: breaker.snapshot() for group, breaker in self.breakers.items()}
+
+    def timeout(self, path: Text) -> aiohttp.ClientTimeout:
+        """
+        Get connect/read timeout of an endpoint, the longest configured path prefix wins
+        :param path: path of the endpoint, e.g. /courses/enroll
+        :return: timeout for the request
+        """
+        prefixes = [prefix for prefix in self.timeouts if prefix != "default" and path.startswith(prefix)]
+        setting = {**self.timeouts["default"], **(self.timeouts[max(prefixes, key=len)] if prefixes else {})}
+        return aiohttp.ClientTimeout(total=None, sock_connect=setting.get("connect"), sock_read=setting.get("read"))
+
+    def session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_event_loop()
+        # A session is bound to the loop it was created on
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._loop = loop
+        return self._session
+
+    async def request(self, method: Text, path: Text, params=None, data=None, access_token=None) -> ApiResponse:
+        response = await self._request(method, path, params, data, access_token)
+        statuses = response_statuses.get()
+        if statuses is not None:
+            statuses.append(response.status)
+        return response
+
+    async def _request(self, method: Text, path: Text, params, data, access_token) -> ApiResponse:
+        params = encode_fields(params)
+        if method != "GET":
+            return await self._send(method, path, params, data, access_token)
+
+        self.singleflight_stats["requests"] += 1
+        key = (path, tuple(params or ()), access_token)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.singleflight_stats["coalesced"] += 1
+        else:
+            inflight = asyncio.ensure_future(self._send(method, path, params, data, access_token))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda done: self._forget_inflight(key, done))
+        # A cancelled caller must not cancel the request of the others
+        return await asyncio.shield(inflight)
+
+    def _forget_inflight(self, key, done):
+        if self._inflight.get(key) is done:
+            del self._inflight[key]
+
+    async def _send(self, method: Text, path: Text, params, data, access_token) -> ApiResponse:
+        group = self.group(path)
+        breaker = self.breakers[group]
+        stale_key = (path, tuple(params or ())) if method == "GET" and access_token is None else None
+        if not breaker.allow():
+            return self._stale_or_raise(stale_key, ServiceUnavailable(group, "circuit breaker is open"))
+
+        headers = {'Accept': 'application/json'}
+        if access_token is not None:
+            headers['Authorization'] = f'Bearer {access_token}'
+        started_at = time.perf_counter()
+        try:
+            async with self.session().request(method, f"{self.api_url}{path}", params=params,
+                                              data=encode_fields(data), headers=headers,
+                                              timeout=self.timeout(path)) as response:
+                content = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            metrics.observe_api_call(method, path, time.perf_counter() - started_at)
+            breaker.record_failure()
+            return self._stale_or_raise(stale_key, ServiceUnavailable(group, repr(e)))
+        except asyncio.CancelledError:
+            # A cancelled probe must not leave the breaker half open
+            if breaker.state == CircuitBreaker.HALF_OPEN:
+                breaker.record_failure()
+            raise
+
+        metrics.observe_api_call(method, path, time.perf_counter() - started_at, response.status, len(content))
+        if response.status >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        if response.status == 401 and access_token is not None:
+            for handler in self.unauthorized_handlers:
+                result = handler(access_token)
+                if asyncio.iscoroutine(result):
+                    await result
+        result = ApiResponse(response.status, content, self.stream_threshold)
+        if stale_key is not None and result.ok:
+            self.stale.set(stale_key, result)
+        return result
+
+    def _stale_or_raise(self, stale_key, error: ServiceUnavailable) -> ApiResponse:
+        stale = self.stale.get(stale_key) if stale_key is not None else None
+        if stale is None:
+            raise error
+        logger.warning(f"{error}, serving the last good response")
+        return stale
+
+    async def warm_up(self, path: Text, params=None, connections: int = 10) -> bool:
+        """
+        Open keep-alive connections of the pool with concurrent requests which are not coalesced, this is also
+        the self-check of the ILearning API
+        :param path: path of a public endpoint
+        :param params: query params
+        :param connections: number of concurrent requests
+        :return: True if all the requests succeeded
+        """
+        params = encode_fields(params)
+        results = await asyncio.gather(*[self._send("GET", path, params, None, None) for _ in range(connections)],
+                                       return_exceptions=True)
+        return all(isinstance(result, ApiResponse) and result.ok for result in results)
+
+    async def get(self, path, params=None, access_token=None) -> ApiResponse:
+        return await self.request("GET", path, params=params, access_token=access_token)
+
+    async def post(self, path, data=None, access_token=None) -> ApiResponse:
+        return await self.request("POST", path, data=data, access_token=access_token)
+
+    async def put(self, path, data=None, access_token=None) -> ApiResponse:
+        return await self.request("PUT", path, data=data, access_token=access_token)
+
+    async def delete(self, path, data=None, access_token=None) -> ApiResponse:
+        return await self.request("DELETE", path, data=data, access_token=access_token)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+client = ILearningClient.from_config(config)
+
+metrics.register(metrics.Gauges(
+    "ilearning_circuit_breaker_open", "1 if the circuit breaker of an endpoint group is open or half open", ["group"],
+    lambda: {(group, ): int(state["state"] != CircuitBreaker.CLOSED) for group, state in client.breaker_states().items()}))
+metrics.register(metrics.Gauges(
+    "ilearning_api_singleflight", "GET requests to the ILearning API and how many were coalesced", ["kind"],
+    lambda: {(kind, ): value for kind, value in client.singleflight_stats.items()}))
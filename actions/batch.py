@@ -0,0 +1,141 @@
+"""
+Offline mode of the summary actions: run them for many users at once and write the messages they would answer
+
+    python -m actions.batch --report statistic --tokens authors.txt --output statistic.jsonl
+    python -m actions.batch --jobs jobs.jsonl --concurrency 20 --output summaries.jsonl
+
+A job file has one JSON object per line with an access_token, optionally a report (statistic, progress,
+my_courses), a course_name for progress, keywords for my_courses and an id which is copied to the result.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from typing import Any, Dict, List, Optional, Text
+
+from rasa_sdk import Tracker
+from rasa_sdk.executor import CollectingDispatcher
+
+from .actions import ActionShowCourseStatistic, ActionShowMyCourses, ActionShowProgressCourse
+from .api import client, response_statuses, ServiceUnavailable
+
+logger = logging.getLogger(__name__)
+
+reports = {
+    "statistic": ActionShowCourseStatistic,
+    "progress": ActionShowProgressCourse,
+    "my_courses": ActionShowMyCourses,
+}
+
+
+def job_tracker(job: Dict[Text, Any]) -> Tracker:
+    """
+    Tracker of a conversation where the user of the job asks for the report
+    """
+    entities = [{"entity": "course_keyword", "value": keyword} for keyword in job.get("keywords") or []]
+    return Tracker(sender_id=f"batch-{job.get('id', '')}",
+                   slots={"access_token": job["access_token"], "course_name": job.get("course_name")},
+                   latest_message={"text": "", "intent": {}, "entities": entities}, events=[], paused=False,
+                   followup_action=None, active_loop={}, latest_action_name=None)
+
+
+async def run_job(job: Dict[Text, Any], default_report: Text, timeout: float) -> Dict[Text, Any]:
+    """
+    Run the action of a report for one user
+    :param job: the job with the access token of the user
+    :param default_report: report of jobs without one
+    :param timeout: seconds the job can take
+    :return: the messages and events of the action or the error
+    """
+    report = job.get("report") or default_report
+    result = {"id": job.get("id"), "report": report}
+    action = reports.get(report)
+    if action is None:
+        return {**result, "ok": False, "error": f"Unknown report {report}"}
+    if not job.get("access_token"):
+        return {**result, "ok": False, "error": "Missing access_token"}
+
+    dispatcher = CollectingDispatcher()
+    # The actions answer a message even when the API fails, the job succeeded only if all the API requests did
+    statuses = []
+    response_statuses.set(statuses)
+    try:
+        events = await asyncio.wait_for(action.perform(dispatcher, job_tracker(job), access_token=job["access_token"]),
+                                        timeout)
+    except (ServiceUnavailable, asyncio.TimeoutError) as e:
+        return {**result, "ok": False, "error": str(e) or "Timeout"}
+    except Exception as e:
+        logger.exception(f"Job {job.get('id')} of report {report} failed")
+        return {**result, "ok": False, "error": repr(e)}
+    result = {**result, "messages": dispatcher.messages, "events": events}
+    # The pending action asks for a login when the token is not valid for the report
+    if any(event.get("event") == "followup" for event in events):
+        return {**result, "ok": False, "error": "Not allowed"}
+    failed = [status for status in statuses if status >= 400]
+    if len(failed) > 0:
+        return {**result, "ok": False, "error": f"ILearning API answered {failed[0]}"}
+    return {**result, "ok": True}
+
+
+async def run_batch(jobs: List[Dict[Text, Any]], default_report: Text, concurrency: int, timeout: float,
+                    output) -> Dict[Text, int]:
+    """
+    Run the jobs with at most concurrency jobs at once and write a JSON line per job as soon as it is done
+    :return: number of jobs and failed jobs
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"jobs": 0, "failed": 0}
+
+    async def run(job):
+        async with semaphore:
+            result = await run_job(job, default_report, timeout)
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        counts["jobs"] += 1
+        counts["failed"] += not result["ok"]
+
+    try:
+        await asyncio.gather(*[run(job) for job in jobs])
+    finally:
+        await client.close()
+    return counts
+
+
+def read_jobs(jobs_path: Optional[Text], tokens_path: Optional[Text]) -> List[Dict[Text, Any]]:
+    jobs = []
+    if jobs_path is not None:
+        with open(jobs_path, encoding="utf-8") as f:
+            jobs += [json.loads(line) for line in f if line.strip()]
+    if tokens_path is not None:
+        with open(tokens_path, encoding="utf-8") as f:
+            jobs += [{"id": i, "access_token": line.strip()} for i, line in enumerate(f) if line.strip()]
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the summary actions for many users")
+    parser.add_argument("--jobs", help="JSON lines file of jobs")
+    parser.add_argument("--tokens", help="file with one access token per line")
+    parser.add_argument("--report", choices=sorted(reports), default="statistic", help="report of jobs without one")
+    parser.add_argument("--concurrency", type=int, default=10, help="jobs run at once")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds a job can take")
+    parser.add_argument("--output", help="JSON lines file of the results, standard output by default")
+    args = parser.parse_args()
+    if args.jobs is None and args.tokens is None:
+        parser.error("--jobs or --tokens is required")
+
+    jobs = read_jobs(args.jobs, args.tokens)
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    started = time.perf_counter()
+    try:
+        counts = asyncio.run(run_batch(jobs, args.report, args.concurrency, args.timeout, output))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"{counts['jobs']} jobs, {counts['failed']} failed in {time.perf_counter() - started:.1f}s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
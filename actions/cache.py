@@ -0,0 +1,274 @@
+import asyncio
+import functools
+import json
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Text, Tuple
+
+from . import metrics
+from .config import config
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+_missing = object()
+
+
+class TTLCache:
+    """
+    LRU cache with a size bound where every entry expires ttl seconds after it was set
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60, timer=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key: Hashable, default=None):
+        entry = self._data.get(key, _missing)
+        if entry is _missing or entry[0] <= self.timer():
+            if entry is not _missing:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (self.timer() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]):
+        for key in [key for key in self._data if predicate(key)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+    # Same async interface as RedisCache, a local cache does not block
+    async def aget(self, key: Hashable, default=None):
+        return self.get(key, default)
+
+    async def aset(self, key: Hashable, value: Any):
+        self.set(key, value)
+
+    async def ainvalidate(self, key: Hashable):
+        self.invalidate(key)
+
+    async def ainvalidate_where(self, predicate: Callable[[Hashable], bool]):
+        self.invalidate_where(predicate)
+
+    def stats(self) -> Dict[Text, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """
+    Cache shared by the workers of the actions server. Entries are JSON values in Redis which expire ttl seconds
+    after they were set, so an invalidation is seen at once by every worker. The size is bounded by the ttl and the
+    maxmemory policy of Redis. Actions use the async methods, which run the blocking Redis calls in the thread pool
+    of the shared caches. An unavailable Redis is a miss, and is not called again for retry_interval seconds
+    """
+
+    def __init__(self, client, prefix: Text, ttl: float = 60, retry_interval: float = 1, timer=time.monotonic):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.timer = timer
+        self.unavailable_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.errors = 0
+
+    def _key(self, key: Hashable) -> Text:
+        return self.prefix + json.dumps(key, separators=(",", ":"))
+
+    def _call(self, default, method: Text, *args, **kwargs):
+        if self.timer() < self.unavailable_until:
+            return default
+        try:
+            return getattr(self.client, method)(*args, **kwargs)
+        except redis.RedisError as e:
+            self._fail(e)
+            return default
+
+    def _fail(self, error):
+        self.errors += 1
+        self.unavailable_until = self.timer() + self.retry_interval
+        logger.warning(f"Shared cache {self.prefix} unavailable: {error}")
+
+    def _keys(self):
+        if self.timer() < self.unavailable_until:
+            return []
+        try:
+            return list(self.client.scan_iter(match=self.prefix + "*", count=1000))
+        except redis.RedisError as e:
+            self._fail(e)
+            return []
+
+    def get(self, key: Hashable, default=None):
+        value = self._call(None, "get", self._key(key))
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key: Hashable, value: Any):
+        self.sets += 1
+        self._call(None, "set", self._key(key), json.dumps(value, separators=(",", ":")), px=int(self.ttl * 1000))
+
+    def invalidate(self, key: Hashable):
+        self._call(None, "delete", self._key(key))
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]):
+        # Keys come back as lists instead of tuples
+        keys = [key for key in self._keys() if predicate(json.loads(key[len(self.prefix):]))]
+        if len(keys) > 0:
+            self._call(None, "delete", *keys)
+
+    def clear(self):
+        keys = self._keys()
+        if len(keys) > 0:
+            self._call(None, "delete", *keys)
+
+    async def aget(self, key: Hashable, default=None):
+        return await run_shared(self.get, key, default)
+
+    async def aset(self, key: Hashable, value: Any):
+        await run_shared(self.set, key, value)
+
+    async def ainvalidate(self, key: Hashable):
+        await run_shared(self.invalidate, key)
+
+    async def ainvalidate_where(self, predicate: Callable[[Hashable], bool]):
+        await run_shared(self.invalidate_where, predicate)
+
+    def stats(self) -> Dict[Text, int]:
+        # Counters of this worker, the size would need a scan of Redis at every scrape
+        return {"hits": self.hits, "misses": self.misses, "sets": self.sets, "errors": self.errors}
+
+
+_redis = None
+_executor = None
+
+
+def shared_redis():
+    """
+    Redis client of the shared caches, one per worker process
+    """
+    global _redis
+    if _redis is None:
+        if redis is None:
+            raise RuntimeError("shared_cache needs the redis package")
+        _redis = redis.Redis.from_url(config["shared_cache"]["url"], decode_responses=True,
+                                      socket_timeout=config["shared_cache"]["timeout"],
+                                      socket_connect_timeout=config["shared_cache"]["timeout"])
+    return _redis
+
+
+async def run_shared(func: Callable, *args, **kwargs):
+    """
+    Run a blocking call of the shared caches in their thread pool so the event loop never waits for Redis
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(config["shared_cache"]["threads"], thread_name_prefix="shared-cache")
+    return await asyncio.get_event_loop().run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def create_cache(name: Text, max_size: int = 1024, ttl: float = 60):
+    """
+    Create a cache of the actions server, shared by the workers in Redis when shared_cache is enabled
+    :param name: name of the cache, part of its Redis keys
+    :param max_size: entries of a per process cache
+    :param ttl: seconds an entry is kept
+    :return: RedisCache or TTLCache
+    """
+    if config["shared_cache"]["enabled"]:
+        return RedisCache(shared_redis(), f"{config['shared_cache']['key_prefix']}{name}:", ttl,
+                          config["shared_cache"]["retry_interval"])
+    return TTLCache(max_size, ttl)
+
+
+def normalize_name(name: Text) -> Text:
+    return " ".join(name.lower().split())
+
+
+# Result of /similar-courses ({"course": ..., "extras": ...}) by normalized course name
+course_cache = create_cache("course", **config["course_cache"])
+# Known roles ({"admin": bool, "author": bool}) by access token
+role_cache = create_cache("role", **config["role_cache"])
+# Pages of the admin tables ({"rows": ..., "has_next": ...}) by action, normalized slots and role
+response_cache = create_cache("response", **config["response_cache"])
+
+
+metrics.register(metrics.Gauges(
+    "ilearning_cache", "Size (local caches), hits, misses, sets and errors (shared caches) of the action server caches",
+    ["cache", "kind"],
+    lambda: {(name, kind): value for name, cache in (("course", course_cache), ("role", role_cache), ("response", response_cache))
+             for kind, value in cache.stats().items()}))
+
+
+async def remember_roles(access_token: Text, user: Dict[Text, Any]):
+    """
+    Remember the roles of a user when the login response contains them
+    :param access_token: the token after login
+    :param user: the user data of the login response
+    """
+    roles = {}
+    if "roles" in user and isinstance(user["roles"], list):
+        names = [role["name"] if isinstance(role, dict) else role for role in user["roles"]]
+        # Only the roles the list states, an admin is not assumed to be an author: /is-author is asked for them
+        roles = {"admin": "admin" in names}
+        if "author" in names:
+            roles["author"] = True
+    for role in ("admin", "author"):
+        if f"is_{role}" in user:
+            roles[role] = bool(user[f"is_{role}"])
+    if roles:
+        await role_cache.aset(access_token, roles)
+
+
+async def forget_roles(access_token: Text):
+    await role_cache.ainvalidate(access_token)
+
+
+def response_key(action: Text, slots: Dict[Text, Any], role: Text) -> Tuple:
+    """
+    Key of a cached response
+    :param action: name of the action
+    :param slots: the slots the response depends on
+    :param role: the role the response is shown to
+    """
+    normalized = tuple(sorted((name, normalize_name(value) if isinstance(value, str) else value)
+                              for name, value in slots.items()))
+    return action, normalized, role
+
+
+async def invalidate_responses(action: Text):
+    """
+    Forget the cached responses of an action after a change of the data it shows
+    :param action: name of the action
+    """
+    await response_cache.ainvalidate_where(lambda key: key[0] == action)
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Text
+
+from . import metrics
+from .api import client, ServiceUnavailable
+from .cache import normalize_name, redis, run_shared, shared_redis
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+# Extends the lock only if this worker still holds it, GET then PEXPIRE would race with a new holder
+extend_lock_script = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+catalog_fields = ["id", "name", "price"]
+redis_errors = redis.RedisError if redis is not None else ()
+
+
+def trigrams(name: Text) -> Set[Text]:
+    padded = f"  {normalize_name(name)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SharedCatalog:
+    """
+    Course catalog shared by the workers in Redis. One worker (the holder of a lock renewed at every refresh)
+    loads the catalog from the API and saves it, the others rebuild their index from Redis when its version changes
+    """
+
+    def __init__(self, client, prefix: Text, lock_ttl: float):
+        self.client = client
+        self.prefix = prefix
+        self.lock_ttl = lock_ttl
+        self.worker_id = f"{os.getpid()}-{id(self)}"
+        self.extend_lock = client.register_script(extend_lock_script)
+
+    def acquire(self) -> bool:
+        """
+        Take or renew the lock of the catalog refresh
+        :return: True if this worker must refresh the catalog from the API
+        """
+        key = f"{self.prefix}lock"
+        ttl = int(self.lock_ttl * 1000)
+        if self.client.set(key, self.worker_id, nx=True, px=ttl):
+            return True
+        return bool(self.extend_lock(keys=[key], args=[self.worker_id, ttl]))
+
+    def save(self, courses: List[Dict[Text, Any]]):
+        pipeline = self.client.pipeline()
+        pipeline.delete(f"{self.prefix}courses")
+        if len(courses) > 0:
+            pipeline.hset(f"{self.prefix}courses",
+                          mapping={str(course["id"]): json.dumps(course, separators=(",", ":")) for course in courses})
+        pipeline.incr(f"{self.prefix}version")
+        pipeline.execute()
+
+    def version(self) -> Optional[int]:
+        version = self.client.get(f"{self.prefix}version")
+        return int(version) if version is not None else None
+
+    def load(self) -> List[Dict[Text, Any]]:
+        return [json.loads(course) for course in self.client.hvals(f"{self.prefix}courses")]
+
+
+class CatalogIndex:
+    """
+    In-process index of the course catalog for exact and fuzzy (trigram similarity) course name lookups.
+    The catalog is loaded in bulk from /courses then refreshed incrementally in the background
+    """
+
+    def __init__(self, enabled: bool = False, refresh_interval: float = 300, page_size: int = 500,
+                 full_reload_every: int = 12, min_similarity: float = 0.5, max_suggestions: int = 3,
+                 shared: Optional[SharedCatalog] = None):
+        self.enabled = enabled
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+        self.full_reload_every = full_reload_every
+        self.min_similarity = min_similarity
+        self.max_suggestions = max_suggestions
+        self.shared = shared
+        self.shared_version = None
+        self.loaded = False
+        self.refreshed_at = None
+        self._courses = {}
+        self._by_name = {}
+        self._trigrams = {}
+        self._index = defaultdict(set)
+        self._task = None
+
+    def __len__(self):
+        return len(self._courses)
+
+    def add(self, course: Dict[Text, Any]):
+        self.remove(course["id"])
+        name = normalize_name(course["name"])
+        grams = trigrams(name)
+        self._courses[course["id"]] = course
+        self._by_name[name] = course["id"]
+        self._trigrams[course["id"]] = grams
+        for gram in grams:
+            self._index[gram].add(course["id"])
+
+    def remove(self, course_id):
+        course = self._courses.pop(course_id, None)
+        if course is None:
+            return
+        self._by_name.pop(normalize_name(course["name"]), None)
+        for gram in self._trigrams.pop(course_id):
+            self._index[gram].discard(course_id)
+
+    def similar(self, course_name: Text) -> List[Dict[Text, Any]]:
+        """
+        Find the courses with the most similar names
+        :param course_name: name of the course
+        :return: courses with a trigram similarity of at least min_similarity, the most similar first
+        """
+        grams = trigrams(course_name)
+        shared = defaultdict(int)
+        for gram in grams:
+            for course_id in self._index.get(gram, ()):
+                shared[course_id] += 1
+        scores = []
+        for course_id, count in shared.items():
+            similarity = count / (len(grams) + len(self._trigrams[course_id]) - count)
+            if similarity >= self.min_similarity:
+                scores.append((similarity, course_id))
+        scores.sort(key=lambda x: -x[0])
+        return [self._courses[course_id] for _, course_id in scores[:self.max_suggestions]]
+
+    def lookup(self, course_name: Text) -> Optional[Dict[Text, Any]]:
+        """
+        Find a course by exact (normalized) name in the same format as /similar-courses. Only exact hits are
+        answered, a miss may be a course published since the last refresh
+        :param course_name: name of the course
+        :return: dict with the course and no extras, None if the index can not answer and the API must be used
+        """
+        self.ensure_started()
+        if not self.loaded:
+            return None
+        course_id = self._by_name.get(normalize_name(course_name))
+        if course_id is None:
+            return None
+        return {"course": self._courses[course_id], "extras": []}
+
+    def suggest(self, course_name: Text) -> Optional[Dict[Text, Any]]:
+        """
+        Suggest the courses with the most similar names, used while the API is unavailable
+        :param course_name: name of the course
+        :return: dict with no course and the similar courses as extras, None if there is none
+        """
+        if not self.loaded:
+            return None
+        extras = self.similar(course_name)
+        if len(extras) == 0:
+            return None
+        return {"course": None, "extras": extras}
+
+    async def fetch(self, updated_since=None) -> List[Dict[Text, Any]]:
+        courses = []
+        cursor = None
+        while True:
+            params = {"limit": self.page_size, "fields[]": catalog_fields, "cursor": cursor,
+                      "updated_since": updated_since}
+            data = (await client.get("/courses", params=params)).json()
+            courses += data["data"]
+            cursor = data.get("next_cursor") or (data.get("meta") or {}).get("next_cursor")
+            if cursor is None or len(data["data"]) == 0:
+                return courses
+
+    async def refresh(self, full: bool = False):
+        started_at = time.time()
+        if full or not self.loaded:
+            courses = await self.fetch()
+            for course_id in set(self._courses) - {course["id"] for course in courses}:
+                self.remove(course_id)
+        else:
+            courses = await self.fetch(updated_since=int(self.refreshed_at))
+        for course in courses:
+            self.add(course)
+        self.loaded = True
+        self.refreshed_at = started_at
+        logger.debug(f"Course catalog index refreshed with {len(courses)} courses, {len(self)} in total")
+
+    async def load_shared(self):
+        """
+        Rebuild the index from the catalog shared by the workers when it changed
+        """
+        version = await run_shared(self.shared.version)
+        if version is None or version == self.shared_version:
+            return
+        courses = await run_shared(self.shared.load)
+        for course_id in set(self._courses) - {course["id"] for course in courses}:
+            self.remove(course_id)
+        for course in courses:
+            self.add(course)
+        self.loaded = True
+        self.refreshed_at = time.time()
+        self.shared_version = version
+        logger.debug(f"Course catalog index loaded from the shared catalog with {len(self)} courses")
+
+    async def run(self):
+        refreshes = 0
+        while True:
+            try:
+                if self.shared is None or await run_shared(self.shared.acquire):
+                    await self.refresh(full=refreshes % self.full_reload_every == 0)
+                    refreshes += 1
+                    if self.shared is not None:
+                        await run_shared(self.shared.save, list(self._courses.values()))
+                        self.shared_version = None
+                else:
+                    # A new holder of the lock starts with a full reload
+                    refreshes = 0
+                    await self.load_shared()
+            except (ServiceUnavailable, KeyError, ValueError) as e:
+                logger.warning(f"Can not refresh course catalog index: {e}")
+            except redis_errors as e:
+                logger.warning(f"Can not use the shared course catalog: {e}")
+            # Workers without a catalog yet wait for the holder of the lock
+            await asyncio.sleep(self.refresh_interval if self.loaded else min(self.refresh_interval, 5))
+
+    def ensure_started(self):
+        """
+        Start the background refresh on the running event loop
+        """
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.ensure_future(self.run())
+
+
+def create_catalog(conf: Dict[Text, Any]) -> CatalogIndex:
+    shared = None
+    if config["shared_cache"]["enabled"]:
+        # The lock outlives a refresh so the same worker keeps refreshing incrementally
+        shared = SharedCatalog(shared_redis(), f"{config['shared_cache']['key_prefix']}catalog:",
+                               2 * conf["refresh_interval"])
+    return CatalogIndex(**conf, shared=shared)
+
+
+catalog = create_catalog(config["catalog"])
+
+metrics.register(metrics.Gauges("ilearning_catalog_courses", "Courses in the in-process catalog index", [],
+                                lambda: {(): len(catalog)}))
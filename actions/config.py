@@ -0,0 +1,84 @@
+import os
+from typing import Any, Dict, Text
+
+from ruamel.yaml import YAML
+
+endpoints_file = os.environ.get("ILEARNING_ENDPOINTS", os.path.join(os.path.dirname(__file__), "..", "endpoints.yml"))
+
+default_config = {
+    "url": "http://127.0.0.1:8000",
+    "pool_size": 100,
+    "keepalive_timeout": 30,
+    "timeouts": {
+        "default": {"connect": 3, "read": 10},
+    },
+    "course_cache": {"max_size": 1024, "ttl": 60},
+    "role_cache": {"max_size": 4096, "ttl": 300},
+    "response_cache": {"max_size": 256, "ttl": 30},
+    "action_deadline": 20,
+    "stream_threshold": 262144,
+    "breaker": {"failure_threshold": 5, "reset_timeout": 30, "stale_size": 1024, "stale_ttl": 600},
+    "metrics": {"enabled": True, "host": "127.0.0.1", "port": 5056},
+    "workers": {"count": 1, "pin_cores": True},
+    "warmup": {"enabled": True, "connections": 10, "timeout": 30, "access_token": None},
+    "shared_cache": {"enabled": False, "url": "redis://127.0.0.1:6379/1", "key_prefix": "ilearning:", "timeout": 0.1,
+                     "retry_interval": 1, "threads": 8},
+    "catalog": {"enabled": False, "refresh_interval": 300, "page_size": 500, "full_reload_every": 12,
+                "min_similarity": 0.5, "max_suggestions": 3},
+}
+
+# Environment variables override the values of the ``ilearning`` section in endpoints.yml
+env_overrides = {
+    "ILEARNING_URL": ("url", str),
+    "ILEARNING_POOL_SIZE": ("pool_size", int),
+    "ILEARNING_KEEPALIVE_TIMEOUT": ("keepalive_timeout", float),
+}
+
+
+def read_endpoints_section(name: Text, path: Text = endpoints_file) -> Dict[Text, Any]:
+    """
+    Read a top level section of endpoints.yml
+    :param name: name of the section
+    :param path: path of the endpoints file
+    :return: the section or an empty dict if the file or section does not exist
+    """
+    if not os.path.isfile(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        content = YAML(typ="safe").load(f) or {}
+    return content.get(name) or {}
+
+
+def load_config(path: Text = endpoints_file) -> Dict[Text, Any]:
+    """
+    Load the ILearning backend config from endpoints.yml and the environment
+    :param path: path of the endpoints file
+    :return: config with url, pool_size, keepalive_timeout and per endpoint timeouts
+    """
+    section = read_endpoints_section("ilearning", path)
+    config = dict(section)
+    # Nested sections are merged so a partial section keeps the other defaults
+    for key, value in default_config.items():
+        if isinstance(value, dict):
+            config[key] = {**value, **(section.get(key) or {})}
+        else:
+            config[key] = section.get(key, value)
+    timeouts = config["timeouts"]
+    timeouts["default"] = {**default_config["timeouts"]["default"], **timeouts["default"]}
+
+    for env, (key, cast) in env_overrides.items():
+        if os.environ.get(env):
+            config[key] = cast(os.environ[env])
+    if os.environ.get("ILEARNING_CONNECT_TIMEOUT"):
+        timeouts["default"] = {**timeouts["default"], "connect": float(os.environ["ILEARNING_CONNECT_TIMEOUT"])}
+    if os.environ.get("ILEARNING_READ_TIMEOUT"):
+        timeouts["default"] = {**timeouts["default"], "read": float(os.environ["ILEARNING_READ_TIMEOUT"])}
+    # Admin token used to preload the admin tables, better kept out of endpoints.yml
+    if os.environ.get("ILEARNING_WARMUP_TOKEN"):
+        config["warmup"]["access_token"] = os.environ["ILEARNING_WARMUP_TOKEN"]
+
+    config["url"] = config["url"].rstrip("/")
+    return config
+
+
+config = load_config()
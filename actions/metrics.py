@@ -0,0 +1,218 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Sequence, Text, Tuple
+
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+size_buckets = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+_lock = threading.Lock()
+
+
+class Counter:
+
+    def __init__(self, name: Text, documentation: Text, label_names: Sequence[Text]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def expose(self) -> List[Text]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with _lock:
+            for labels, value in self.values.items():
+                lines.append(f"{self.name}{format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name: Text, documentation: Text, label_names: Sequence[Text],
+                 buckets: Sequence[float] = latency_buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., +Inf count, sum]
+        self.values = {}
+
+    def observe(self, value: float, *labels):
+        with _lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def expose(self) -> List[Text]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            for labels, counts in self.values.items():
+                for bound, count in zip(self.buckets, counts):
+                    le = format_labels(self.label_names + ("le",), labels + (str(bound),))
+                    lines.append(f"{self.name}_bucket{le} {count}")
+                le = format_labels(self.label_names + ("le",), labels + ("+Inf",))
+                lines.append(f"{self.name}_bucket{le} {counts[-2]}")
+                lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {counts[-2]}")
+                lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {counts[-1]}")
+        return lines
+
+
+class Gauges:
+    """
+    Gauges read from a callback at scrape time
+    """
+
+    def __init__(self, name: Text, documentation: Text, label_names: Sequence[Text],
+                 collect: Callable[[], Dict[Tuple, float]]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.collect = collect
+
+    def expose(self) -> List[Text]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in self.collect().items():
+            lines.append(f"{self.name}{format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+def format_labels(names, values) -> Text:
+    if len(names) == 0:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+action_seconds = Histogram("ilearning_action_duration_seconds", "Duration of action runs, pending action performs "
+                                                                "and backend helpers", ["function"])
+action_calls = Counter("ilearning_action_calls_total", "Calls of actions and backend helpers", ["function"])
+action_errors = Counter("ilearning_action_errors_total", "Actions and backend helpers which raised", ["function"])
+api_seconds = Histogram("ilearning_api_request_duration_seconds", "Duration of ILearning API requests",
+                        ["method", "endpoint"])
+api_calls = Counter("ilearning_api_requests_total", "ILearning API requests by status", ["method", "endpoint", "status"])
+api_errors = Counter("ilearning_api_errors_total", "ILearning API requests which failed or answered 5xx",
+                     ["method", "endpoint"])
+api_response_bytes = Histogram("ilearning_api_response_bytes", "Size of ILearning API response bodies",
+                               ["method", "endpoint"], size_buckets)
+
+registry = [action_seconds, action_calls, action_errors, api_seconds, api_calls, api_errors, api_response_bytes]
+
+
+def register(metric):
+    registry.append(metric)
+    return metric
+
+
+def timed(func):
+    """
+    Record duration, calls and errors of a sync or async function labelled by its qualified name,
+    e.g. EnrollCourse.perform
+    :param func: function to instrument
+    :return: the wrapped function
+    """
+    label = func.__qualname__
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except BaseException:
+                action_errors.inc(label)
+                raise
+            finally:
+                action_calls.inc(label)
+                action_seconds.observe(time.perf_counter() - started_at, label)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                action_errors.inc(label)
+                raise
+            finally:
+                action_calls.inc(label)
+                action_seconds.observe(time.perf_counter() - started_at, label)
+    return wrapper
+
+
+def observe_api_call(method: Text, endpoint: Text, seconds: float, status=None, size=None):
+    """
+    Record an ILearning API request
+    :param method: http method
+    :param endpoint: path of the endpoint
+    :param seconds: duration of the request
+    :param status: status code, None if the request failed
+    :param size: size of the response body
+    """
+    api_seconds.observe(seconds, method, endpoint)
+    api_calls.inc(method, endpoint, "error" if status is None else str(status))
+    if status is None or status >= 500:
+        api_errors.inc(method, endpoint)
+    if size is not None:
+        api_response_bytes.observe(size, method, endpoint)
+
+
+def expose() -> Text:
+    lines = []
+    for metric in registry:
+        lines += metric.expose()
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            status, body, content_type = 200, expose(), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            status, body, content_type = 404, "Not found", "text/plain"
+        content = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+
+
+def start_server(host: Text = config["metrics"]["host"], port: int = config["metrics"]["port"]):
+    """
+    Serve /metrics for Prometheus from a daemon thread, once per process. Worker i of the multi-process
+    actions server (ILEARNING_WORKER) listens on port + i
+    """
+    global _server
+    if _server is not None or not config["metrics"]["enabled"]:
+        return
+    port += int(os.environ.get("ILEARNING_WORKER", 0))
+    try:
+        _server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logger.warning(f"Can not start metrics server on {host}:{port}: {e}")
+        return
+    threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Metrics server listening on http://{host}:{port}/metrics")
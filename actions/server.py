@@ -0,0 +1,154 @@
+"""
+Multi-process mode of the actions server: the workers share the listening socket and each one is pinned to a core
+
+    python -m actions.server --workers 4 --port 5055
+
+Enable shared_cache in endpoints.yml so the workers share the course, role and response caches and the course
+catalog in Redis instead of warming their own. Worker i serves its metrics on the metrics port + i.
+
+Every worker warms up when it starts (warmup in endpoints.yml): it opens its ILearning API connections, checks the
+API and loads the course catalog and the first pages of the admin tables. GET /ready answers 503 until all the
+workers are warmed up, then 200, so a load balancer only sends traffic to a warm server. A worker whose warm up failed
+still counts as ready (it serves cold), a worker which exited does not.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import List, Optional
+
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+
+def worker_cores(workers: int) -> List[Optional[int]]:
+    """
+    Cores the workers are pinned to, round robin over the cores the server may use
+    :param workers: number of workers
+    :return: core of every worker, None if pinning is not supported
+    """
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * workers
+    cores = sorted(os.sched_getaffinity(0))
+    return [cores[i % len(cores)] for i in range(workers)]
+
+
+# States of the workers shared with the parent process
+STARTING = 0
+READY = 1
+COLD = 2
+EXITED = -1
+
+
+def serve(sock: socket.socket, worker: int, core: Optional[int], states, args):
+    os.environ["ILEARNING_WORKER"] = str(worker)
+    if core is not None:
+        os.sched_setaffinity(0, {core})
+    # Imported in the worker so every worker has its own event loop, connection pool and Redis client
+    from rasa_sdk.endpoint import create_app
+    from sanic import response
+
+    from .metrics import start_server
+
+    # Started here and not when the actions are imported, so batch runs, scripts and tests do not take the port
+    start_server()
+
+    app = create_app(args.actions, cors_origins=args.cors)
+
+    async def warm_up_worker():
+        state = READY
+        try:
+            if config["warmup"]["enabled"]:
+                from .actions import warm_up
+                await warm_up()
+        except Exception:
+            state = COLD
+            logger.exception(f"Warm up of worker {worker} failed, it serves cold")
+        finally:
+            states[worker] = state
+
+    async def start_warm_up(app, loop):
+        # A task so the server answers /ready while it warms up
+        asyncio.ensure_future(warm_up_worker())
+
+    async def ready(request):
+        current = states[:]
+        ready = all(state in (READY, COLD) for state in current)
+        return response.json({"ready": ready, "workers": args.workers,
+                              "ready_workers": sum(state in (READY, COLD) for state in current),
+                              "cold_workers": current.count(COLD), "exited_workers": current.count(EXITED)},
+                             status=200 if ready else 503)
+
+    app.register_listener(start_warm_up, "after_server_start")
+    app.add_route(ready, "/ready", methods=["GET"])
+    logger.info(f"Actions server worker {worker} started" + (f" on core {core}" if core is not None else ""))
+    app.run(sock=sock, workers=1, access_log=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the actions server with several worker processes")
+    parser.add_argument("--actions", default="actions", help="package of the actions")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--workers", type=int, default=config["workers"]["count"], help="number of worker processes")
+    parser.add_argument("--no-pin", action="store_true", help="do not pin the workers to cores")
+    parser.add_argument("--cors", default="*", help="CORS origins of the actions server")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.workers > 1 and not config["shared_cache"]["enabled"]:
+        logger.warning("shared_cache is not enabled, every worker keeps its own caches")
+    pin = config["workers"]["pin_cores"] and not args.no_pin
+    cores = worker_cores(args.workers) if pin else [None] * args.workers
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+
+    # Forked so the workers inherit the listening socket
+    context = multiprocessing.get_context("fork")
+    # State of every worker, /ready answers 200 once all of them finished their warm up and none exited
+    states = context.Array("i", [STARTING] * args.workers)
+    processes = [context.Process(target=serve, args=(sock, worker, core, states, args),
+                                 name=f"actions-worker-{worker}")
+                 for worker, core in enumerate(cores)]
+    for process in processes:
+        process.start()
+    logger.info(f"Actions server listening on http://{args.host}:{args.port} with {args.workers} workers")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGINT)
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        # The workers can not see each other exit, the parent marks them for /ready of the workers still running
+        while any(process.is_alive() for process in processes):
+            for worker, process in enumerate(processes):
+                if not process.is_alive() and states[worker] != EXITED:
+                    states[worker] = EXITED
+                    if not stopping:
+                        logger.error(f"Actions server worker {worker} exited with code {process.exitcode}")
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop(signal.SIGINT, None)
+        for process in processes:
+            process.join()
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
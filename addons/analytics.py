@@ -0,0 +1,177 @@
+import glob
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Text, Tuple
+
+# Funnel name -> steps, a step is intent:<name>, action:<name> or utter:<response> (utter action or bot message)
+default_funnels = {
+    "enroll_course": ["intent:enroll_course", "action:action_enroll_course", "utter:utter_enroll_succeed"],
+    "buy_course": ["intent:enroll_course", "utter:utter_ask_buy_course", "action:action_buy_course"],
+    "login": ["action:login_form", "action:action_access_and_perform"],
+    "register": ["intent:register", "action:register_form", "action:action_register"],
+}
+
+
+def event_steps(event: Dict[Text, Any]) -> List[Text]:
+    """
+    :return: the funnel steps an event matches
+    """
+    kind = event.get("event")
+    if kind == "user":
+        intent = (event.get("parse_data") or {}).get("intent") or {}
+        return [f"intent:{intent.get('name')}"]
+    if kind == "action":
+        name = event.get("name") or ""
+        return [f"action:{name}", f"utter:{name}"] if name.startswith("utter_") else [f"action:{name}"]
+    if kind == "bot":
+        metadata = event.get("metadata") or {}
+        response = metadata.get("utter_action") or metadata.get("template_name")
+        return [f"utter:{response}"] if response else []
+    return []
+
+
+class Rollup:
+    """
+    Per-intent, per-action and per-day counts and funnel conversions rolled up from a stream of conversation events
+    """
+
+    def __init__(self, funnels: Optional[Dict[Text, List[Text]]] = None, conversation_timeout: float = 86400):
+        self.funnels = funnels or default_funnels
+        self.conversation_timeout = conversation_timeout
+        self.events = 0
+        self.intents = defaultdict(int)
+        self.actions = defaultdict(int)
+        self.days = defaultdict(lambda: defaultdict(int))
+        self.reached = {name: [0] * len(steps) for name, steps in self.funnels.items()}
+        # sender id -> [timestamp of the last event, {funnel: next step}]
+        self.progress = {}
+
+    def update(self, event: Dict[Text, Any]):
+        self.events += 1
+        kind = event.get("event")
+        timestamp = event.get("timestamp") or time.time()
+        day = self.days[datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d")]
+        day["events"] += 1
+        if kind == "user":
+            self.intents[((event.get("parse_data") or {}).get("intent") or {}).get("name")] += 1
+            day["user_messages"] += 1
+        elif kind == "action":
+            self.actions[event.get("name")] += 1
+        elif kind == "session_started":
+            day["sessions"] += 1
+        self.advance(event.get("sender_id"), timestamp, event_steps(event))
+
+    def advance(self, sender_id: Text, timestamp: float, steps: List[Text]):
+        state = self.progress.setdefault(sender_id, [timestamp, {}])
+        state[0] = timestamp
+        if len(steps) == 0:
+            return
+        for name, funnel in self.funnels.items():
+            position = state[1].get(name, 0)
+            if position < len(funnel) and funnel[position] in steps:
+                self.reached[name][position] += 1
+                # A completed funnel starts again for the next attempt of the conversation
+                state[1][name] = 0 if position + 1 == len(funnel) else position + 1
+
+    def prune(self, now: Optional[float] = None):
+        """
+        Forget the funnel progress of conversations without event for conversation_timeout seconds
+        """
+        limit = (now or time.time()) - self.conversation_timeout
+        self.progress = {sender: state for sender, state in self.progress.items() if state[0] >= limit}
+
+    def report(self) -> Dict[Text, Any]:
+        funnels = {}
+        for name, steps in self.funnels.items():
+            reached = self.reached[name]
+            funnels[name] = {"steps": [{"step": step, "reached": count,
+                                        "conversion": count / reached[0] if reached[0] else 0.0}
+                                       for step, count in zip(steps, reached)]}
+        return {"events": self.events, "intents": dict(self.intents), "actions": dict(self.actions),
+                "days": {day: dict(counts) for day, counts in sorted(self.days.items())}, "funnels": funnels}
+
+    def to_dict(self) -> Dict[Text, Any]:
+        return {**self.report(), "reached": self.reached, "progress": self.progress}
+
+    @classmethod
+    def from_dict(cls, data: Dict[Text, Any], funnels: Optional[Dict[Text, List[Text]]] = None,
+                  conversation_timeout: float = 86400) -> "Rollup":
+        rollup = cls(funnels, conversation_timeout)
+        rollup.events = data.get("events", 0)
+        rollup.intents.update(data.get("intents", {}))
+        rollup.actions.update(data.get("actions", {}))
+        for day, counts in data.get("days", {}).items():
+            rollup.days[day].update(counts)
+        for name, reached in data.get("reached", {}).items():
+            if name in rollup.reached and len(reached) == len(rollup.reached[name]):
+                rollup.reached[name] = reached
+        rollup.progress = data.get("progress", {})
+        return rollup
+
+
+# Suffix of the consumed segments delete_consumed took from their writer
+claimed_suffix = ".claimed.jsonl"
+
+
+class FileEventSource:
+    """
+    Read the segments of FileEventBroker in batches and remember the offset of every segment
+    """
+
+    def __init__(self, path: Text, offsets: Optional[Dict[Text, int]] = None):
+        self.path = path
+        self.offsets = offsets or {}
+
+    def segments(self) -> List[Text]:
+        return sorted(os.path.basename(p) for p in glob.glob(os.path.join(self.path, "*.jsonl")))
+
+    def batches(self, batch_size: int) -> Iterable[Tuple[List[Dict[Text, Any]], Dict[Text, int]]]:
+        """
+        :return: batches of events with the offsets to commit once the batch is processed
+        """
+        for segment in self.segments():
+            offset = self.offsets.get(segment, 0)
+            with open(os.path.join(self.path, segment), "rb") as f:
+                f.seek(offset)
+                batch = []
+                for line in f:
+                    # An incomplete last line is still being written
+                    if not line.endswith(b"\n"):
+                        break
+                    offset += len(line)
+                    batch.append(json.loads(line))
+                    if len(batch) >= batch_size:
+                        yield batch, {**self.offsets, segment: offset}
+                        batch = []
+                if len(batch) > 0:
+                    yield batch, {**self.offsets, segment: offset}
+
+    def commit(self, offsets: Dict[Text, int]):
+        self.offsets = offsets
+
+    def delete_consumed(self, grace: float = 60) -> int:
+        """
+        Delete the segments consumed up to their end. A consumed segment is first claimed with a rename: its writer
+        finds its path missing and starts a new segment, and the lines it may have appended meanwhile are still read
+        from the claimed segment, which is deleted once consumed and unchanged for grace seconds
+        :param grace: seconds a claimed segment stays after its last change
+        :return: number of deleted segments
+        """
+        deleted = 0
+        for segment in self.segments():
+            path = os.path.join(self.path, segment)
+            if self.offsets.get(segment, -1) < os.path.getsize(path):
+                continue
+            if segment.endswith(claimed_suffix):
+                if time.time() - os.path.getmtime(path) >= grace:
+                    os.remove(path)
+                    self.offsets.pop(segment)
+                    deleted += 1
+            else:
+                claimed = segment[:-len(".jsonl")] + claimed_suffix
+                os.rename(path, os.path.join(self.path, claimed))
+                self.offsets[claimed] = self.offsets.pop(segment)
+        return deleted
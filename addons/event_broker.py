@@ -0,0 +1,88 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+from typing import Any, Dict, Optional, Text
+
+from rasa.core.brokers.broker import EventBroker
+from rasa.utils.endpoints import EndpointConfig
+
+logger = logging.getLogger(__name__)
+
+
+class FileEventBroker(EventBroker):
+    """
+    Event broker which appends the conversation events as JSON lines to local segment files for offline analytics.
+    publish only queues the event, a background thread writes the queue in batches every flush_interval seconds.
+    Every process writes its own segments ({host}-{pid}-{index}.jsonl) and starts a new one after segment_size bytes
+    or when the consumer claimed the current one
+    """
+
+    def __init__(self, path: Text = "analytics/events", segment_size: int = 64 * 1024 * 1024,
+                 flush_interval: float = 1, max_queue: int = 100000):
+        self.path = path
+        self.segment_size = segment_size
+        self.flush_interval = flush_interval
+        self.writer = f"{socket.gethostname()}-{os.getpid()}"
+        self.dropped = 0
+        self._queue = queue.Queue(max_queue)
+        self._segment = 0
+        self._file = None
+        self._closed = threading.Event()
+        os.makedirs(path, exist_ok=True)
+        self._thread = threading.Thread(target=self.run, name="event-broker", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    async def from_endpoint_config(cls, broker_config: EndpointConfig,
+                                   event_loop: Optional[asyncio.AbstractEventLoop] = None) -> "FileEventBroker":
+        return cls(broker_config.url or "analytics/events", **broker_config.kwargs)
+
+    def publish(self, event: Dict[Text, Any]) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Event queue is full, {self.dropped} events dropped")
+
+    def segment_path(self, segment: int) -> Text:
+        return os.path.join(self.path, f"{self.writer}-{segment:08d}.jsonl")
+
+    def write(self, lines):
+        # The analytics consumer renames a segment once it consumed it, the next lines go to a new one
+        claimed = self._file is not None and not os.path.exists(self.segment_path(self._segment))
+        if self._file is None or claimed or self._file.tell() >= self.segment_size:
+            if self._file is not None:
+                self._file.close()
+                self._segment += 1
+            self._file = open(self.segment_path(self._segment), "a", encoding="utf-8")
+        self._file.write("".join(lines))
+        self._file.flush()
+
+    def flush(self):
+        lines = []
+        while True:
+            try:
+                lines.append(json.dumps(self._queue.get_nowait(), separators=(",", ":")) + "\n")
+            except queue.Empty:
+                break
+        if len(lines) > 0:
+            self.write(lines)
+
+    def run(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning(f"Can not write events: {e}")
+
+    async def close(self) -> None:
+        self._closed.set()
+        self._thread.join()
+        self.flush()
+        if self._file is not None:
+            self._file.close()
@@ -0,0 +1,36 @@
+from typing import Any
+
+from rasa.core.policies.policy import PolicyPrediction
+from rasa.core.policies.ted_policy import TEDPolicy
+from rasa.shared.core.domain import Domain
+from rasa.shared.core.trackers import DialogueStateTracker
+from rasa.shared.nlu.interpreter import NaturalLanguageInterpreter
+
+FAST_PATH_INTENTS = "fast_path_intents"
+
+
+class RuleFirstTEDPolicy(TEDPolicy):
+    """
+    TEDPolicy which does not run its model on the turns of intents answered by unconditional rules.
+    RulePolicy has a higher priority and predicts these turns anyway, TED inference is only CPU cost there
+    """
+
+    defaults = {**TEDPolicy.defaults, FAST_PATH_INTENTS: []}
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.fast_path_intents = set(self.config[FAST_PATH_INTENTS])
+
+    def is_fast_path(self, tracker: DialogueStateTracker) -> bool:
+        """
+        :return: whether the latest user intent is answered by a rule and no form is active
+        """
+        intent = (tracker.latest_message.intent or {}).get("name") if tracker.latest_message else None
+        return intent in self.fast_path_intents and tracker.active_loop_name is None
+
+    def predict_action_probabilities(self, tracker: DialogueStateTracker, domain: Domain,
+                                     interpreter: NaturalLanguageInterpreter,
+                                     **kwargs: Any) -> PolicyPrediction:
+        if self.is_fast_path(tracker):
+            return self._prediction(self._default_predictions(domain))
+        return super().predict_action_probabilities(tracker, domain, interpreter, **kwargs)
@@ -0,0 +1,289 @@
+import atexit
+import json
+import logging
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterable, List, Optional, Text, Tuple
+
+import redis
+from rasa.core.brokers.broker import EventBroker
+from rasa.core.tracker_store import SQLTrackerStore, TrackerStore
+from rasa.shared.core.constants import ACTION_LISTEN_NAME
+from rasa.shared.core.domain import Domain
+from rasa.shared.core.events import ActiveLoop, SlotSet
+from rasa.shared.core.slots import Slot
+from rasa.shared.core.trackers import DialogueStateTracker
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+MSGPACK = b"m"
+JSON = b"j"
+
+
+def encode_events(events: List[Dict[Text, Any]], level: int = 6) -> bytes:
+    """
+    Encode events in a compact binary form: zlib compressed msgpack, or compact JSON if msgpack is not installed
+    :param events: events as dicts
+    :param level: zlib compression level
+    :return: one byte of format then the compressed events
+    """
+    if msgpack is not None:
+        return MSGPACK + zlib.compress(msgpack.packb(events, use_bin_type=True), level)
+    return JSON + zlib.compress(json.dumps(events, separators=(",", ":")).encode("utf-8"), level)
+
+
+def decode_events(data: bytes) -> List[Dict[Text, Any]]:
+    kind, payload = data[:1], zlib.decompress(data[1:])
+    if kind == MSGPACK:
+        if msgpack is None:
+            raise ValueError("Events are encoded with msgpack which is not installed")
+        return msgpack.unpackb(payload, raw=False)
+    return json.loads(payload)
+
+
+def unsaved_events(events: List[Dict[Text, Any]], count: int, last: Optional[float]):
+    """
+    Find the events of a tracker which are not stored yet
+    :param events: events of the tracker
+    :param count: number of stored events
+    :param last: timestamp of the last stored event
+    :return: the new events and whether the stored events must be replaced by all the events
+    """
+    if last is None:
+        return events, True
+    if 0 < count <= len(events) and events[count - 1]["timestamp"] == last:
+        return events[count:], False
+    # The tracker was loaded before the conversation was compacted or its history was cut
+    for i in range(len(events) - 1, -1, -1):
+        if events[i]["timestamp"] == last:
+            return events[i + 1:], False
+    return events, True
+
+
+def compact_events(sender_id: Text, events: List[Dict[Text, Any]], slots: List[Slot],
+                   keep_events: int) -> Optional[List[Dict[Text, Any]]]:
+    """
+    Replace the events before the last keep_events by a snapshot of the slots and active form.
+    The kept window starts at a user turn so the policies see complete turns
+    :param sender_id: id of the conversation
+    :param events: events of the conversation
+    :param slots: slots of the domain
+    :param keep_events: minimum number of events to keep
+    :return: the snapshot then the kept events, None if there is nothing to compact
+    """
+    cut = None
+    for i in range(len(events) - keep_events, 0, -1):
+        if events[i].get("event") == "action" and events[i].get("name") == ACTION_LISTEN_NAME and \
+                i + 1 < len(events) and events[i + 1].get("event") == "user":
+            cut = i
+            break
+    if cut is None:
+        return None
+
+    state = DialogueStateTracker.from_dict(sender_id, events[:cut], slots)
+    timestamp = events[cut]["timestamp"]
+    snapshot = [SlotSet(slot.name, slot.value, timestamp=timestamp) for slot in state.slots.values()
+                if slot.value != slot.initial_value]
+    if state.active_loop_name is not None:
+        snapshot.append(ActiveLoop(state.active_loop_name, timestamp=timestamp))
+    return [event.as_dict() for event in snapshot] + events[cut:]
+
+
+class ArchiveWriter:
+    """
+    Write-behind of conversation events to the events table of a SQL tracker store from a background thread.
+    Every save submits only its new events, numbered by their sequence in the conversation. The sequence of the
+    last archived event is kept in Redis (archived field of the meta key) so an event is written once, whatever
+    the sessions and compactions of the conversation and the retries of failed writes
+    """
+
+    def __init__(self, domain: Domain, red, meta_key: Callable[[Text], Text], interval: float = 5,
+                 **store_config: Any):
+        self.domain = domain
+        self.red = red
+        self.meta_key = meta_key
+        self.interval = interval
+        self.store_config = store_config
+        self.store = None
+        # sender_id -> list of (sequence, event)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, sender_id: Text, events: List[Dict[Text, Any]], last_sequence: int):
+        """
+        Queue new events of a conversation
+        :param sender_id: id of the conversation
+        :param events: the new events
+        :param last_sequence: sequence of the last event, the first event of the conversation is 1
+        """
+        first = last_sequence - len(events) + 1
+        with self._lock:
+            self._pending.setdefault(sender_id, []).extend(zip(range(first, last_sequence + 1), events))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="tracker-archive", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def archived(self, sender_id: Text) -> int:
+        return int(self.red.hget(self.meta_key(sender_id), "archived") or 0)
+
+    def write(self, sender_id: Text, events: List[Tuple[int, Dict[Text, Any]]]):
+        events = [(sequence, event) for sequence, event in events if sequence > self.archived(sender_id)]
+        if len(events) == 0:
+            return
+        if self.store is None:
+            self.store = SQLTrackerStore(self.domain, **self.store_config)
+        with self.store.session_scope() as session:
+            for _, event in events:
+                # Same columns as SQLTrackerStore.save
+                session.add(self.store.SQLEvent(
+                    sender_id=sender_id, type_name=event["event"], timestamp=event.get("timestamp"),
+                    intent_name=(event.get("parse_data") or {}).get("intent", {}).get("name"),
+                    action_name=event.get("name"), data=json.dumps(event)))
+            session.commit()
+        self.red.hset(self.meta_key(sender_id), "archived", events[-1][0])
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for sender_id, events in pending.items():
+            try:
+                self.write(sender_id, events)
+            except Exception as e:
+                logger.warning(f"Can not archive conversation {sender_id}: {e}")
+                with self._lock:
+                    self._pending[sender_id] = events + self._pending.get(sender_id, [])
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Can not archive conversations: {e}")
+
+    def pending(self) -> int:
+        return sum(len(events) for events in self._pending.values())
+
+
+class CompactRedisTrackerStore(TrackerStore):
+    """
+    Redis tracker store which appends the new events of every save as one compressed chunk to a list instead of
+    rewriting the whole tracker as JSON. Conversations expire record_exp seconds after their last save and can be
+    archived asynchronously to a SQL tracker store (archive section) for analytics.
+    When a conversation has more than max_events events, the events before the last keep_events are replaced by
+    a snapshot of the slots so the load time of a tracker does not grow with the age of the conversation
+    """
+
+    def __init__(self, domain: Domain, host: Text = "localhost", port: int = 6379, db: int = 0,
+                 password: Optional[Text] = None, use_ssl: bool = False, key_prefix: Text = "tracker:",
+                 record_exp: Optional[float] = None, compression_level: int = 6, max_events: Optional[int] = None,
+                 keep_events: int = 100, archive: Optional[Dict[Text, Any]] = None,
+                 event_broker: Optional[EventBroker] = None, **kwargs: Any):
+        super().__init__(domain, event_broker, **kwargs)
+        self.red = redis.StrictRedis(host=host, port=int(port), db=int(db), password=password, ssl=use_ssl)
+        self.key_prefix = key_prefix
+        self.record_exp = int(record_exp) if record_exp else None
+        self.compression_level = compression_level
+        self.max_events = int(max_events) if max_events else None
+        self.keep_events = int(keep_events)
+        self.archive = None
+        if archive:
+            archive = dict(archive)
+            self.archive = ArchiveWriter(domain, self.red, self.meta_key, archive.pop("interval", 5), **archive)
+
+    def events_key(self, sender_id: Text) -> Text:
+        return f"{self.key_prefix}events:{sender_id}"
+
+    def meta_key(self, sender_id: Text) -> Text:
+        return f"{self.key_prefix}meta:{sender_id}"
+
+    def stored_meta(self, sender_id: Text):
+        count, last = self.red.hmget(self.meta_key(sender_id), "count", "last")
+        return int(count or 0), float(last) if last is not None else None
+
+    def write(self, pipeline, sender_id: Text, events: List[Dict[Text, Any]], count: int, replace: bool):
+        """
+        Queue the writes of events on a pipeline
+        :param events: events to append, or to store instead of the stored ones if replace
+        :param count: number of events stored after the write
+        """
+        events_key, meta_key = self.events_key(sender_id), self.meta_key(sender_id)
+        if replace:
+            pipeline.delete(events_key)
+        if len(events) > 0:
+            pipeline.rpush(events_key, encode_events(events, self.compression_level))
+            pipeline.hset(meta_key, mapping={"count": count, "last": repr(events[-1]["timestamp"])})
+        if self.record_exp:
+            pipeline.expire(events_key, self.record_exp)
+            pipeline.expire(meta_key, self.record_exp)
+
+    def save(self, tracker: DialogueStateTracker, timeout: Optional[float] = None) -> None:
+        events = [event.as_dict() for event in tracker.events]
+        count, last = self.stored_meta(tracker.sender_id)
+        new_events, replace = unsaved_events(events, count, last)
+        count = len(new_events) if replace else count + len(new_events)
+        # Events which were never saved, a replace of a known conversation also rewrites events saved before
+        added = new_events if not replace or last is None else [event for event in events
+                                                                if event["timestamp"] > last]
+
+        pipeline = self.red.pipeline()
+        # Sequence of the events in the conversation, compaction does not change it
+        pipeline.hincrby(self.meta_key(tracker.sender_id), "sequence", len(added))
+        self.write(pipeline, tracker.sender_id, new_events, count, replace)
+        sequence = pipeline.execute()[0]
+
+        if self.event_broker:
+            for event in added:
+                self.event_broker.publish({"sender_id": tracker.sender_id, **event})
+        if self.archive is not None and len(added) > 0:
+            self.archive.submit(tracker.sender_id, added, sequence)
+        if self.max_events and count > self.max_events:
+            self.compact(tracker.sender_id)
+
+    def compact(self, sender_id: Text) -> bool:
+        """
+        Replace the old events of a conversation by a snapshot if it has more than max_events events.
+        The conversation is left as is if it is saved meanwhile
+        :return: whether the conversation was compacted
+        """
+        meta_key = self.meta_key(sender_id)
+        with self.red.pipeline() as pipeline:
+            try:
+                pipeline.watch(meta_key)
+                events = self.retrieve_events(sender_id)
+                if len(events) <= (self.max_events or self.keep_events):
+                    return False
+                compacted = compact_events(sender_id, events, self.domain.slots, self.keep_events)
+                if compacted is None:
+                    return False
+                pipeline.multi()
+                self.write(pipeline, sender_id, compacted, len(compacted), True)
+                pipeline.execute()
+            except redis.WatchError:
+                return False
+        logger.debug(f"Conversation {sender_id} compacted from {len(events)} to {len(compacted)} events")
+        return True
+
+    def retrieve_events(self, sender_id: Text) -> List[Dict[Text, Any]]:
+        events = []
+        for chunk in self.red.lrange(self.events_key(sender_id), 0, -1):
+            events += decode_events(chunk)
+        return events
+
+    def retrieve(self, sender_id: Text) -> Optional[DialogueStateTracker]:
+        events = self.retrieve_events(sender_id)
+        if len(events) == 0:
+            return None
+        return DialogueStateTracker.from_dict(sender_id, events, self.domain.slots)
+
+    def keys(self) -> Iterable[Text]:
+        prefix = self.events_key("")
+        return [key.decode("utf-8")[len(prefix):] for key in self.red.scan_iter(f"{prefix}*")]
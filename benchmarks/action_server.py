@@ -0,0 +1,154 @@
+"""
+Load test of the actions server: send /webhook calls of every custom action at a target concurrency
+and report throughput and latency percentiles per action
+
+    python -m benchmarks.mock_api --port 8000 &
+    rasa run actions
+    python -m benchmarks.action_server --concurrency 50 --duration 30
+
+With --start-mock the mock ILearning API is started in the benchmark process,
+the actions server must then be started with ILEARNING_URL pointing to it.
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from collections import defaultdict
+from typing import Any, Dict, Text
+
+import aiohttp
+
+from benchmarks import mock_api
+from benchmarks.stats import print_report, summarize
+
+
+def entity(name, value):
+    return {"entity": name, "value": value}
+
+
+# Action name -> (slots, entities of the latest message, intent), tokens are set per simulated user
+scenarios = {
+    "action_check_courses": ({}, [entity("course_keyword", "course")], "courses"),
+    "action_show_courses": ({"course_keyword": ["python"]}, [], "show_courses"),
+    "action_next_courses": ({"courses_cursor": {"action": "action_check_courses", "keywords": [], "cursor": "3"}},
+                            [], "next_page"),
+    "action_detail_course": ({"course_name": "Course 7"}, [], "detail_course"),
+    "action_buy_course": ({"course_name": "Course 3"}, [], "enroll_course"),
+    "action_enroll_course": ({"course_name": "Course 5", "access_token": True}, [], "enroll_course"),
+    "action_show_my_courses": ({"access_token": True}, [], "show_my_courses"),
+    "action_show_progress_course": ({"course_name": "Course 5", "access_token": True}, [], "show_progress_course"),
+    "action_show_pending_courses": ({"access_token": True}, [], "show_pending_courses"),
+    "action_approve_course": ({"course_name": "Course 11", "access_token": True}, [], "approve_course"),
+    "action_show_resources": ({"resource_type": "category", "access_token": True}, [], "show_resources"),
+    "action_add_resource": ({"resource_type": "category", "resource_name": "category new", "access_token": True},
+                            [], "add_resource"),
+    "action_edit_resource": ({"resource_type": "category", "resource_name": "category 2",
+                              "new_resource_name": "category two", "access_token": True}, [], "edit_resource"),
+    "action_delete_resource": ({"resource_type": "category", "resource_name": "category 3", "access_token": True},
+                               [], "delete_resource"),
+    "action_show_course_statistic": ({"access_token": True}, [], "show_course_statistic"),
+    "action_access_and_perform": ({"email": "admin@ilearning.test", "password": "secret",
+                                   "pending_action": "action_show_pending_courses"}, [], "password"),
+    "action_register": ({"username": "user", "email": "user@ilearning.test", "password": "secret"}, [], "password"),
+}
+
+
+def webhook_payload(action: Text, user: int, rng: random.Random) -> Dict[Text, Any]:
+    """
+    Build the request the Rasa server sends to the actions server to run an action
+    :param action: name of the action
+    :param user: index of the simulated user, each user has its own access token
+    :param rng: random generator for sender ids
+    :return: json payload of /webhook
+    """
+    slots, entities, intent = scenarios[action]
+    slots = {key: (f"token-user-{user}" if value is True else value) for key, value in slots.items()}
+    return {
+        "next_action": action,
+        "sender_id": f"bench-{user}-{rng.randrange(1 << 30)}",
+        "tracker": {
+            "sender_id": f"bench-{user}",
+            "slots": slots,
+            "latest_message": {"intent": {"name": intent, "confidence": 1.0}, "entities": entities, "text": ""},
+            "events": [],
+            "paused": False,
+            "followup_action": None,
+            "active_loop": {},
+            "latest_action_name": "action_listen",
+        },
+        "domain": {},
+        "version": "2.8.14",
+    }
+
+
+async def run_load(url: Text, actions, concurrency: int, duration: float, requests: int, users: int, seed: int):
+    rng = random.Random(seed)
+    deadline = time.perf_counter() + duration
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    sequence = itertools.count()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def worker():
+            while time.perf_counter() < deadline:
+                i = next(sequence)
+                if requests and i >= requests:
+                    return
+                action = actions[i % len(actions)]
+                payload = webhook_payload(action, rng.randrange(users), rng)
+                started_at = time.perf_counter()
+                try:
+                    async with session.post(url, json=payload) as response:
+                        await response.read()
+                        failed = response.status != 200
+                except aiohttp.ClientError:
+                    failed = True
+                latencies[action].append(time.perf_counter() - started_at)
+                if failed:
+                    errors[action] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    rows = [summarize(action, latencies[action], elapsed, errors[action]) for action in actions]
+    rows.append(summarize("all", [x for values in latencies.values() for x in values], elapsed, sum(errors.values())))
+    return rows
+
+
+async def main_async(args):
+    runner = None
+    if args.start_mock:
+        runner = await mock_api.start(port=args.mock_port, **mock_api.mock_kwargs(args))
+    try:
+        actions = args.actions.split(",") if args.actions else list(scenarios)
+        if args.warmup > 0:
+            await run_load(args.url, actions, args.concurrency, args.warmup, 0, args.users, args.seed)
+        rows = await run_load(args.url, actions, args.concurrency, args.duration, args.requests, args.users, args.seed)
+        print_report(rows, f"Actions server {args.url}, concurrency {args.concurrency}", args.output)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the actions server")
+    parser.add_argument("--url", default="http://localhost:5055/webhook", help="webhook of the actions server")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent requests")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of the measured run")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests, 0 for no limit")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of unmeasured run before")
+    parser.add_argument("--users", type=int, default=100, help="number of simulated users (access tokens)")
+    parser.add_argument("--actions", default="", help="comma separated actions, default all")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--start-mock", action="store_true", help="start the mock ILearning API")
+    parser.add_argument("--mock-port", type=int, default=8000)
+    mock_api.add_arguments(parser)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Compare Rasa configurations on inference latency, CPU time per message, model size and accuracy
+
+    python -m benchmarks.config_benchmark --configs config.yml config.production.yml
+
+Every configuration is trained on the same split of data/nlu.yml with the stories and rules, then the held out NLU
+examples are parsed (intent and entity accuracy, NLU latency) and the next action is predicted at every step of the
+stories and test stories (action accuracy, policy latency).
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Text
+
+import rasa
+from rasa.core.agent import Agent
+from rasa.shared.core.events import ActionExecuted
+from rasa.shared.core.trackers import DialogueStateTracker
+from rasa.shared.nlu.training_data.loading import load_data
+
+from benchmarks.stats import percentile
+
+
+def split_nlu(path: Text, directory: Text, train_frac: float, seed: int):
+    """
+    Split the NLU data into a training file and held out test examples
+    :return: path of the training file and test examples as (text, intent, entities)
+    """
+    train, test = load_data(path).train_test_split(train_frac=train_frac, random_seed=seed)
+    train_path = os.path.join(directory, "nlu_train.yml")
+    with open(train_path, "w", encoding="utf-8") as f:
+        f.write(train.nlu_as_yaml())
+    examples = [(message.get("text"), message.get("intent"),
+                 {(entity["entity"], entity.get("value")) for entity in message.get("entities") or []})
+                for message in test.intent_examples]
+    return train_path, examples
+
+
+def train(config: Text, training_files: List[Text], directory: Text) -> Dict[Text, Any]:
+    name = os.path.splitext(os.path.basename(config))[0]
+    started = time.perf_counter()
+    result = rasa.train("domain.yml", config, training_files, output=directory, force_training=True,
+                        fixed_model_name=name)
+    if result.model is None:
+        raise RuntimeError(f"Training with {config} failed")
+    return {"config": config, "model": result.model, "train_seconds": time.perf_counter() - started,
+            "model_mb": os.path.getsize(result.model) / 1024 / 1024}
+
+
+async def evaluate_nlu(agent, examples) -> Dict[Text, float]:
+    latencies = []
+    intents = entities = 0
+    cpu_started = time.process_time()
+    for text, intent, expected in examples:
+        started = time.perf_counter()
+        parsed = await agent.parse_message_using_nlu_interpreter(text)
+        latencies.append(time.perf_counter() - started)
+        intents += parsed["intent"]["name"] == intent
+        entities += {(entity["entity"], entity.get("value")) for entity in parsed.get("entities", [])} == expected
+    cpu = time.process_time() - cpu_started
+    latencies.sort()
+    return {"nlu_p50": percentile(latencies, 50) * 1000, "nlu_p95": percentile(latencies, 95) * 1000,
+            "nlu_cpu": cpu / max(len(examples), 1) * 1000, "intent_accuracy": intents / max(len(examples), 1),
+            "entity_accuracy": entities / max(len(examples), 1)}
+
+
+async def evaluate_policies(agent, story_files: List[Text]) -> Dict[Text, float]:
+    processor = agent.create_processor()
+    latencies = []
+    correct = 0
+    cpu = 0.0
+    for path in story_files:
+        for story in await agent.load_data(path, augmentation_factor=0):
+            events = list(story.events)
+            for i, event in enumerate(events):
+                if not isinstance(event, ActionExecuted) or i == 0 or event.action_name is None:
+                    continue
+                tracker = DialogueStateTracker.from_events(story.sender_id, events[:i], agent.domain.slots)
+                cpu_started = time.process_time()
+                started = time.perf_counter()
+                action, _ = processor.predict_next_action(tracker)
+                latencies.append(time.perf_counter() - started)
+                cpu += time.process_time() - cpu_started
+                correct += action.name() == event.action_name
+    latencies.sort()
+    return {"policy_p50": percentile(latencies, 50) * 1000, "policy_p95": percentile(latencies, 95) * 1000,
+            "policy_cpu": cpu / max(len(latencies), 1) * 1000, "action_accuracy": correct / max(len(latencies), 1)}
+
+
+async def evaluate(row: Dict[Text, Any], examples, story_files: List[Text]):
+    agent = Agent.load(row["model"])
+    # First predictions build the graphs, they are not measured
+    for text, _, _ in examples[:5]:
+        await agent.parse_message_using_nlu_interpreter(text)
+    row.update(await evaluate_nlu(agent, examples))
+    row.update(await evaluate_policies(agent, story_files))
+
+
+def print_rows(rows: List[Dict[Text, Any]]):
+    columns = [("model_mb", "model MB", ".1f"), ("train_seconds", "train s", ".0f"), ("nlu_p50", "nlu p50", ".1f"),
+               ("nlu_p95", "nlu p95", ".1f"), ("nlu_cpu", "nlu cpu", ".1f"), ("intent_accuracy", "intent", ".3f"),
+               ("entity_accuracy", "entities", ".3f"), ("policy_p50", "pol p50", ".1f"),
+               ("policy_p95", "pol p95", ".1f"), ("policy_cpu", "pol cpu", ".1f"),
+               ("action_accuracy", "action", ".3f")]
+    print("Latency and CPU time per message in ms, accuracy on held out NLU examples and story steps")
+    print(f"{'config':<28}" + "".join(f"{title:>10}" for _, title, _ in columns))
+    for row in rows:
+        print(f"{row['config']:<28}" + "".join(f"{row[key]:>10{spec}}" for key, _, spec in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Rasa configurations on latency, model size and accuracy")
+    parser.add_argument("--configs", nargs="+", default=["config.yml", "config.production.yml"])
+    parser.add_argument("--nlu", default="data/nlu.yml")
+    parser.add_argument("--stories", nargs="+", default=["data/stories.yml", "data/rules.yml"],
+                        help="stories and rules to train on")
+    parser.add_argument("--test-stories", nargs="+", default=["data/stories.yml", "tests/test_stories.yml"],
+                        help="stories to predict the actions of")
+    parser.add_argument("--train-frac", type=float, default=0.8, help="fraction of the NLU examples to train on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        nlu_train, examples = split_nlu(args.nlu, directory, args.train_frac, args.seed)
+        rows = []
+        for config in args.configs:
+            row = train(config, [nlu_train] + args.stories, directory)
+            asyncio.run(evaluate(row, examples, args.test_stories))
+            del row["model"]
+            rows.append(row)
+    print_rows(rows)
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Replay the conversation stories as concurrent synthetic users through the full Rasa stack
+(REST channel, NLU, policies and actions server) and report turns per second, latency per intent
+and the time of every turn split into NLU, policy and action
+
+    python -m benchmarks.mock_api --port 8000 &
+    ILEARNING_URL=http://127.0.0.1:8000 rasa run actions --port 5065
+    rasa run --enable-api
+    python -m benchmarks.dialogue_replay --users 20 --duration 60 --action-proxy 5055
+
+The split is read from the event timestamps of the conversation trackers, so rasa must run with --enable-api:
+NLU is the time until the user message is logged, the rest of the turn until the last event is the policy and actions
+time. With --action-proxy the benchmark listens on the port of action_endpoint in endpoints.yml, forwards the calls
+to the actions server (--action-server) and times them to separate the action time from the policy time.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Text
+
+import aiohttp
+from aiohttp import web
+from ruamel.yaml import YAML
+
+from benchmarks import mock_api
+from benchmarks.stats import print_report, summarize
+
+annotation = re.compile(r"\[(?P<text>[^\]]+)\](\((?P<name>[^)]+)\)|(?P<json>{[^}]+}))?")
+
+split_parts = ("nlu", "policy", "action", "other")
+
+
+def read_yaml(path: Text) -> Dict[Text, Any]:
+    with open(path, encoding="utf-8") as f:
+        return YAML(typ="safe").load(f) or {}
+
+
+def entity_name(match) -> Optional[Text]:
+    if match.group("name"):
+        return match.group("name").split(":")[0]
+    if match.group("json"):
+        return json.loads(match.group("json")).get("entity")
+    return None
+
+
+def render(example: Text, values: Dict[Text, Any]) -> Text:
+    """
+    Text of an annotated training example
+    :param example: example with entities in the markdown format, e.g. find [Python](course_keyword) courses
+    :param values: entity name -> value to put in place of the annotated text
+    :return: the plain text
+    """
+    def replace(match):
+        value = values.get(entity_name(match))
+        return str(value) if value is not None else match.group("text")
+
+    return annotation.sub(replace, example).strip()
+
+
+def load_examples(path: Text) -> Dict[Text, List[Text]]:
+    """
+    Read the annotated examples of every intent of a NLU training file
+    """
+    examples = defaultdict(list)
+    for item in read_yaml(path).get("nlu", []):
+        if "intent" not in item:
+            continue
+        items = item.get("examples") or []
+        if isinstance(items, str):
+            items = [line.strip()[2:] for line in items.splitlines() if line.strip().startswith("- ")]
+        examples[item["intent"]] += [x["text"].strip() if isinstance(x, dict) else str(x).strip() for x in items]
+    return examples
+
+
+def story_entities(step: Dict[Text, Any]) -> Dict[Text, Any]:
+    values = {}
+    for entity in step.get("entities") or []:
+        if isinstance(entity, dict):
+            values.update(entity)
+        else:
+            values[entity] = None
+    return values
+
+
+def user_text(intent: Text, values: Dict[Text, Any], examples: Dict[Text, List[Text]], rng: random.Random) -> Text:
+    """
+    Pick a training example of the intent with the entities of the story step and put in their values
+    """
+    candidates = examples.get(intent) or [intent.replace("_", " ")]
+    wanted = set(values)
+    annotated = [x for x in candidates if wanted <= {entity_name(m) for m in annotation.finditer(x)}]
+    exact = [x for x in annotated if {entity_name(m) for m in annotation.finditer(x)} == wanted]
+    return render(rng.choice(exact or annotated or candidates), values)
+
+
+def load_stories(paths: List[Text], examples: Dict[Text, List[Text]], rng: random.Random) -> List[Dict[Text, Any]]:
+    """
+    Turn stories and test stories into the messages of synthetic users
+    :param paths: story files
+    :param examples: NLU examples by intent to write the messages of stories without user text
+    :param rng: random generator to pick examples
+    :return: stories with their turns, every turn has the text, intent and expected actions
+    """
+    stories = []
+    for path in paths:
+        for story in read_yaml(path).get("stories", []):
+            turns = []
+            for step in story.get("steps", []):
+                if "intent" in step:
+                    values = story_entities(step)
+                    text = render(step["user"], values) if "user" in step else \
+                        user_text(step["intent"], values, examples, rng)
+                    turns.append({"text": text, "intent": step["intent"], "actions": []})
+                elif "action" in step and len(turns) > 0:
+                    turns[-1]["actions"].append(step["action"])
+            if len(turns) > 0:
+                stories.append({"name": story.get("story", path), "turns": turns})
+    return stories
+
+
+class ActionProxy:
+    """
+    Forward the action calls of rasa to the actions server and record their duration by conversation
+    """
+
+    def __init__(self, upstream: Text):
+        self.upstream = upstream
+        # sender id -> [(wall clock start, seconds, action name)]
+        self.calls = defaultdict(list)
+        self.session = None
+
+    async def webhook(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        payload = json.loads(body)
+        started_at = time.time()
+        started = time.perf_counter()
+        async with self.session.post(self.upstream, data=body, headers={"Content-Type": "application/json"}) as r:
+            content = await r.read()
+            response = web.Response(body=content, status=r.status, content_type="application/json")
+        self.calls[payload.get("sender_id")].append((started_at, time.perf_counter() - started,
+                                                     payload.get("next_action")))
+        return response
+
+    def pop(self, sender: Text) -> List:
+        return self.calls.pop(sender, [])
+
+    async def start(self, port: int) -> web.AppRunner:
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+        app = web.Application()
+        app.router.add_post("/webhook", self.webhook)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        return runner
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+def split_turns(events: List[Dict[Text, Any]], turns: List[Dict[Text, Any]], action_calls: Optional[List]):
+    """
+    Split the time of every sent turn into NLU, policy, action and other (channel, tracker store) time
+    from the timestamps of the tracker events
+    :param events: events of the conversation tracker
+    :param turns: sent turns with their wall clock send time and latency, updated in place
+    :param action_calls: timed action calls of the conversation, None if the actions are not proxied
+    """
+    user_indexes = [i for i, event in enumerate(events) if event.get("event") == "user"]
+    for turn, index, next_index in zip(turns, user_indexes, user_indexes[1:] + [len(events)]):
+        user_at = events[index]["timestamp"]
+        turn_events = events[index + 1:next_index]
+        end_at = max([event["timestamp"] for event in turn_events] + [user_at])
+        executed = [event["name"] for event in turn_events
+                    if event.get("event") == "action" and event.get("name") != "action_listen"]
+        action = 0.0
+        if action_calls is not None:
+            action = sum(seconds for started_at, seconds, _ in action_calls if turn["sent_at"] <= started_at <= end_at)
+        turn["split"] = {
+            "nlu": max(user_at - turn["sent_at"], 0.0),
+            "policy": max(end_at - user_at - action, 0.0),
+            "action": action,
+            "other": max(turn["sent_at"] + turn["latency"] - end_at, 0.0),
+        }
+        turn["mismatch"] = len(turn["expected"]) > 0 and executed[:len(turn["expected"])] != turn["expected"]
+
+
+async def replay_story(session: aiohttp.ClientSession, rasa_url: Text, sender: Text, story: Dict[Text, Any],
+                       proxy: Optional[ActionProxy]) -> List[Dict[Text, Any]]:
+    turns = []
+    for step in story["turns"]:
+        turn = {"intent": step["intent"], "expected": step["actions"], "sent_at": time.time(), "failed": False}
+        started = time.perf_counter()
+        try:
+            async with session.post(f"{rasa_url}/webhooks/rest/webhook",
+                                    json={"sender": sender, "message": step["text"]}) as response:
+                await response.read()
+                turn["failed"] = response.status != 200
+        except aiohttp.ClientError:
+            turn["failed"] = True
+        turn["latency"] = time.perf_counter() - started
+        turns.append(turn)
+        if turn["failed"]:
+            break
+
+    action_calls = proxy.pop(sender) if proxy is not None else None
+    try:
+        async with session.get(f"{rasa_url}/conversations/{sender}/tracker") as response:
+            if response.status == 200:
+                split_turns((await response.json()).get("events", []), turns, action_calls)
+    except (aiohttp.ClientError, ValueError):
+        pass
+    return turns
+
+
+async def run_replay(rasa_url: Text, stories: List[Dict[Text, Any]], users: int, duration: float,
+                     proxy: Optional[ActionProxy], seed: int):
+    rng = random.Random(seed)
+    deadline = time.perf_counter() + duration
+    conversations = itertools.count()
+    results = []
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=users * 2)) as session:
+        async def user():
+            while time.perf_counter() < deadline:
+                story = rng.choice(stories)
+                results.extend(await replay_story(session, rasa_url, f"replay-{seed}-{next(conversations)}",
+                                                  story, proxy))
+
+        started = time.perf_counter()
+        await asyncio.gather(*[user() for _ in range(users)])
+        elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+def report(turns: List[Dict[Text, Any]], elapsed: float, title: Text, output: Optional[Text], proxied: bool):
+    by_intent = defaultdict(list)
+    for turn in turns:
+        by_intent[turn["intent"]].append(turn)
+
+    rows = []
+    for name, group in sorted(by_intent.items()) + [("all", turns)]:
+        row = summarize(name, [turn["latency"] for turn in group], elapsed, sum(turn["failed"] for turn in group))
+        split = [turn["split"] for turn in group if "split" in turn]
+        for part in split_parts:
+            row[part] = sum(x[part] for x in split) / len(split) * 1000 if split else None
+        row["mismatches"] = sum(turn.get("mismatch", False) for turn in group)
+        rows.append(row)
+
+    print_report(rows, title, output)
+    print()
+    print("Mean time per turn in ms" + ("" if proxied else ", action time is counted in policy without --action-proxy"))
+    print(f"{'intent':<40}{'nlu':>10}{'policy':>10}{'action':>10}{'other':>10}{'mismatch':>10}")
+    for row in rows:
+        if row["nlu"] is None:
+            print(f"{row['name']:<40}{'-':>10}{'-':>10}{'-':>10}{'-':>10}{row['mismatches']:>10}")
+        else:
+            print(f"{row['name']:<40}{row['nlu']:>10.1f}{row['policy']:>10.1f}{row['action']:>10.1f}"
+                  f"{row['other']:>10.1f}{row['mismatches']:>10}")
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    stories = load_stories(args.stories, load_examples(args.nlu), rng)
+    runners = []
+    proxy = None
+    try:
+        if args.start_mock:
+            runners.append(await mock_api.start(port=args.mock_port, **mock_api.mock_kwargs(args)))
+        if args.action_proxy:
+            proxy = ActionProxy(args.action_server)
+            runners.append(await proxy.start(args.action_proxy))
+        if args.warmup > 0:
+            await run_replay(args.rasa_url, stories, args.users, args.warmup, proxy, args.seed + 1)
+        turns, elapsed = await run_replay(args.rasa_url, stories, args.users, args.duration, proxy, args.seed)
+        report(turns, elapsed, f"Replay of {len(stories)} stories on {args.rasa_url}, {args.users} users, "
+                               f"{len(turns) / elapsed:.1f} turns/s", args.output, proxy is not None)
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+        if proxy is not None:
+            await proxy.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the stories through rasa as concurrent users")
+    parser.add_argument("--rasa-url", default="http://localhost:5005", help="rasa server started with --enable-api")
+    parser.add_argument("--stories", nargs="+", default=["data/stories.yml", "tests/test_stories.yml"])
+    parser.add_argument("--nlu", default="data/nlu.yml", help="NLU data to write the messages of the stories")
+    parser.add_argument("--users", type=int, default=10, help="concurrent synthetic users")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of the measured run")
+    parser.add_argument("--warmup", type=float, default=10, help="seconds of unmeasured run before")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--action-proxy", type=int, default=0,
+                        help="port of action_endpoint to listen on and time the action calls, 0 to disable")
+    parser.add_argument("--action-server", default="http://localhost:5065/webhook",
+                        help="webhook of the actions server behind the proxy")
+    parser.add_argument("--start-mock", action="store_true", help="start the mock ILearning API")
+    parser.add_argument("--mock-port", type=int, default=8000)
+    mock_api.add_arguments(parser)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Local stub of the ILearning API used by the benchmarks
+
+    python -m benchmarks.mock_api --port 8000 --mock-latency 0.05 --mock-jitter 0.02 --mock-courses 2000
+"""
+import argparse
+import asyncio
+import random
+from typing import Any, Dict, List, Text
+
+from aiohttp import web
+
+resource_plural = {"categories": "category", "languages": "language", "programming-languages": "programming-language"}
+
+
+class MockILearningApi:
+    """
+    In-memory ILearning API answering with the same payload shapes as the real backend
+    """
+
+    def __init__(self, courses: int = 1000, resources: int = 100, latency: float = 0.0, jitter: float = 0.0,
+                 padding: int = 0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        # Extra text on every course to tune the payload size
+        description = "x" * padding
+        self.courses = [{"id": i, "name": f"Course {i}", "price": 0 if i % 3 else 20, "status": "published",
+                         "earned": i * 10, "enroll": i, "rating": 4.5, "description": description}
+                        for i in range(1, courses + 1)]
+        self.by_name = {course["name"].lower(): course for course in self.courses}
+        self.resources = {uri: [{"id": i, "name": f"{uri} {i}"} for i in range(1, resources + 1)]
+                          for uri in resource_plural.values()}
+
+    async def delay(self):
+        if self.latency > 0 or self.jitter > 0:
+            await asyncio.sleep(max(self.latency + self.random.uniform(-self.jitter, self.jitter), 0))
+
+    @staticmethod
+    def project(items: List[Dict[Text, Any]], request: web.Request) -> List[Dict[Text, Any]]:
+        fields = request.query.getall("fields[]", [])
+        if len(fields) == 0:
+            return items
+        return [{key: value for key, value in item.items() if key in fields} for item in items]
+
+    def paginate(self, items: List[Dict[Text, Any]], request: web.Request) -> Dict[Text, Any]:
+        """
+        Cursor pagination with limit/cursor, page pagination with page/per_page, the full list otherwise
+        """
+        if "limit" in request.query:
+            limit = int(request.query["limit"])
+            start = int(request.query.get("cursor", 0))
+            next_cursor = str(start + limit) if start + limit < len(items) else None
+            return {"data": self.project(items[start:start + limit], request), "next_cursor": next_cursor}
+        if "page" in request.query:
+            page = int(request.query["page"])
+            per_page = int(request.query.get("per_page", 15))
+            start = (page - 1) * per_page
+            return {"data": self.project(items[start:start + per_page], request),
+                    "meta": {"current_page": page, "last_page": max((len(items) - 1) // per_page + 1, 1)}}
+        return {"data": self.project(items, request)}
+
+    def similar(self, name: Text, items: List[Dict[Text, Any]]) -> List[Dict[Text, Any]]:
+        words = set(name.lower().split())
+        return [item for item in items if words & set(item["name"].lower().split())][:3]
+
+    async def courses_handler(self, request):
+        await self.delay()
+        keywords = [keyword.lower() for keyword in request.query.getall("keywords[]", [])]
+        courses = [course for course in self.courses
+                   if not keywords or any(keyword in course["name"].lower() for keyword in keywords)]
+        return web.json_response(self.paginate(courses, request))
+
+    async def similar_courses_handler(self, request):
+        await self.delay()
+        name = request.query.get("course_name", "")
+        course = self.by_name.get(name.lower())
+        return web.json_response({"data": {"course": course,
+                                            "extras": None if course else self.similar(name, self.courses)}})
+
+    async def login_handler(self, request):
+        await self.delay()
+        form = await request.post()
+        email = form.get("email", "user@ilearning.test")
+        return web.json_response({"success": True, "data": {"name": email.split("@")[0], "token": f"token-{email}",
+                                                            "is_admin": email.startswith("admin"),
+                                                            "is_author": email.startswith(("admin", "author"))}})
+
+    async def register_handler(self, request):
+        await self.delay()
+        form = await request.post()
+        email = form.get("email", "user@ilearning.test")
+        return web.json_response({"success": True, "data": {"name": form.get("username", email),
+                                                            "token": f"token-{email}"}})
+
+    async def role_handler(self, request):
+        await self.delay()
+        if "Authorization" not in request.headers:
+            return web.json_response({"message": "Unauthenticated."}, status=401)
+        return web.json_response({"data": True})
+
+    async def success_handler(self, request):
+        await self.delay()
+        if "Authorization" not in request.headers:
+            return web.json_response({"message": "Unauthenticated."}, status=401)
+        await request.read()
+        return web.json_response({"success": True, "extras": None})
+
+    async def my_courses_handler(self, request):
+        await self.delay()
+        return web.json_response(self.paginate(self.courses[:200], request))
+
+    async def pending_handler(self, request):
+        await self.delay()
+        return web.json_response(self.paginate(self.courses[::10], request))
+
+    async def progress_handler(self, request):
+        await self.delay()
+        return web.json_response({"data": {"complete": 3, "total": 10}})
+
+    async def statistic_handler(self, request):
+        await self.delay()
+        return web.json_response({"data": self.courses[:20]})
+
+    async def resources_handler(self, request):
+        await self.delay()
+        uri = resource_plural.get(request.match_info["types"])
+        if uri is None:
+            return await self.success_handler(request)
+        return web.json_response(self.paginate(self.resources[uri], request))
+
+    async def resource_similar_handler(self, request):
+        await self.delay()
+        items = self.resources.get(request.match_info["type"], [])
+        name = request.query.get("name", "")
+        resource = next((item for item in items if item["name"].lower() == name.lower()), None)
+        return web.json_response({"data": {"resource": resource,
+                                           "extras": None if resource else self.similar(name, items)}})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/courses", self.courses_handler)
+        app.router.add_get("/api/similar-courses", self.similar_courses_handler)
+        app.router.add_post("/api/login", self.login_handler)
+        app.router.add_post("/api/register", self.register_handler)
+        app.router.add_get("/api/is-admin", self.role_handler)
+        app.router.add_get("/api/is-author", self.role_handler)
+        app.router.add_post("/api/courses/enroll", self.success_handler)
+        app.router.add_put("/api/courses/approve", self.success_handler)
+        app.router.add_get("/api/courses/my-courses", self.my_courses_handler)
+        app.router.add_get("/api/courses/pending", self.pending_handler)
+        app.router.add_get("/api/courses/progress", self.progress_handler)
+        app.router.add_get("/api/author/courses/statistic", self.statistic_handler)
+        app.router.add_get("/api/admin/{type}/similar", self.resource_similar_handler)
+        app.router.add_get("/api/admin/{types}", self.resources_handler)
+        app.router.add_post("/api/admin/{type}", self.success_handler)
+        app.router.add_delete("/api/admin/{type}", self.success_handler)
+        return app
+
+
+async def start(host: Text = "127.0.0.1", port: int = 8000, **kwargs) -> web.AppRunner:
+    """
+    Start the mock API on the running event loop
+    :return: runner to cleanup to stop it
+    """
+    runner = web.AppRunner(MockILearningApi(**kwargs).app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--mock-latency", type=float, default=0.02, help="seconds before every mock answer")
+    parser.add_argument("--mock-jitter", type=float, default=0.01, help="random +/- seconds on the latency")
+    parser.add_argument("--mock-courses", type=int, default=1000, help="number of courses in the catalog")
+    parser.add_argument("--mock-padding", type=int, default=0, help="extra bytes of description per course")
+
+
+def mock_kwargs(args) -> Dict[Text, Any]:
+    return {"latency": args.mock_latency, "jitter": args.mock_jitter, "courses": args.mock_courses,
+            "padding": args.mock_padding}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock ILearning API for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_arguments(parser)
+    args = parser.parse_args()
+    app = MockILearningApi(**mock_kwargs(args)).app()
+    web.run_app(app, host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
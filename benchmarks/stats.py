@@ -0,0 +1,56 @@
+import json
+import math
+from typing import Any, Dict, List, Optional, Sequence, Text
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """
+    Nearest-rank percentile
+    :param values: sorted values
+    :param p: percentile between 0 and 100
+    :return: the percentile, 0 if there is no value
+    """
+    if len(values) == 0:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def summarize(name: Text, latencies: List[float], elapsed: float, errors: int = 0) -> Dict[Text, Any]:
+    """
+    Throughput and latency percentiles of a set of requests
+    :param name: name of the row
+    :param latencies: latency of every request in seconds
+    :param elapsed: wall time of the run in seconds
+    :param errors: number of failed requests
+    :return: summary row, latencies in milliseconds
+    """
+    values = sorted(latencies)
+    return {
+        "name": name,
+        "requests": len(values),
+        "errors": errors,
+        "throughput": len(values) / elapsed if elapsed > 0 else 0.0,
+        "p50": percentile(values, 50) * 1000,
+        "p95": percentile(values, 95) * 1000,
+        "p99": percentile(values, 99) * 1000,
+        "max": (values[-1] if values else 0.0) * 1000,
+    }
+
+
+def print_report(rows: List[Dict[Text, Any]], title: Text, output: Optional[Text] = None):
+    """
+    Print summary rows as a table and optionally write them as JSON
+    :param rows: rows of summarize
+    :param title: title of the table
+    :param output: path of the JSON file
+    """
+    print(title)
+    print(f"{'name':<40}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'max ms':>10}")
+    for row in rows:
+        print(f"{row['name']:<40}{row['requests']:>10}{row['errors']:>8}{row['throughput']:>10.1f}{row['p50']:>10.1f}"
+              f"{row['p95']:>10.1f}{row['p99']:>10.1f}{row['max']:>10.1f}")
+    if output is not None:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"title": title, "rows": rows}, f, indent=2)
@@ -0,0 +1,93 @@
+"""
+Turn latency of tracker stores under load: every turn retrieves the conversation, adds the events of a turn
+(user message, action, slots with course lists, bot message with a table payload) and saves it
+
+    python -m benchmarks.tracker_store --stores endpoints.redis.yml benchmarks/endpoints.sql.yml --concurrency 20 --conversations 500
+
+Every store is configured by the tracker_store section of an endpoints file.
+"""
+import argparse
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from rasa.core.tracker_store import TrackerStore
+from rasa.shared.core.domain import Domain
+from rasa.shared.core.events import ActionExecuted, BotUttered, SlotSet, UserUttered
+from rasa.shared.core.trackers import DialogueStateTracker
+from rasa.utils.endpoints import read_endpoint_config
+
+from benchmarks.stats import print_report, summarize
+
+
+def turn_events(turn: int, rng: random.Random, table_rows: int):
+    courses = [f"Course {rng.randrange(5000)}" for _ in range(3)]
+    table = {"type": "table", "rows": [{"id": i, "name": f"Course {i}", "price": i % 50} for i in range(table_rows)]}
+    return [
+        UserUttered(f"show me some courses {turn}", {"name": "courses", "confidence": 0.98}),
+        ActionExecuted("action_check_courses"),
+        SlotSet("recent_courses", courses),
+        BotUttered("Here are some courses", {"custom": table}),
+        ActionExecuted("action_listen"),
+    ]
+
+
+def run_store(store: TrackerStore, domain: Domain, conversations: int, turns: int, concurrency: int,
+              table_rows: int, seed: int):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def conversation(index: int):
+        rng = random.Random(seed + index)
+        sender_id = f"bench-{uuid.uuid4().hex}"
+        for turn in range(turns):
+            started = time.perf_counter()
+            try:
+                tracker = store.retrieve(sender_id) or DialogueStateTracker(sender_id, domain.slots)
+                for event in turn_events(turn, rng, table_rows):
+                    tracker.update(event)
+                store.save(tracker)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(conversation, range(conversations)))
+    return latencies, errors[0], time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Turn latency of tracker stores under load")
+    parser.add_argument("--stores", nargs="+", default=["endpoints.redis.yml"],
+                        help="endpoints files with the tracker_store section to benchmark")
+    parser.add_argument("--domain", default="domain.yml")
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=20, help="turns per conversation")
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent conversations")
+    parser.add_argument("--table-rows", type=int, default=10, help="rows of the table payload of every bot message")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    domain = Domain.load(args.domain)
+    rows = []
+    for endpoints in args.stores:
+        config = read_endpoint_config(endpoints, "tracker_store")
+        store = TrackerStore.create(config, domain=domain)
+        latencies, errors, elapsed = run_store(store, domain, args.conversations, args.turns, args.concurrency,
+                                               args.table_rows, args.seed)
+        name = f"{endpoints} ({config.type if config else 'in memory'})"
+        rows.append(summarize(name, latencies, elapsed, errors))
+    print_report(rows, f"Tracker store turns, {args.concurrency} concurrent conversations of {args.turns} turns",
+                 args.output)
+
+
+if __name__ == "__main__":
+    main()
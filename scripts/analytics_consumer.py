@@ -0,0 +1,82 @@
+"""
+Roll up the conversation events written by addons.event_broker.FileEventBroker into per-intent, per-action and
+per-day counts and funnel conversions, once or every --interval seconds
+
+    python -m scripts.analytics_consumer --events analytics/events --output analytics/stats.json --interval 60
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Text
+
+from addons.analytics import FileEventSource, Rollup
+
+logger = logging.getLogger(__name__)
+
+
+def write_json(path: Text, data: Dict[Text, Any]):
+    """
+    Write a JSON file atomically so readers never see a partial file
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def consume(source: FileEventSource, rollup: Rollup, state_path: Text, batch_size: int) -> int:
+    """
+    Roll up the new events batch by batch, the state is saved after every batch
+    :return: number of events consumed
+    """
+    consumed = 0
+    for events, offsets in source.batches(batch_size):
+        for event in events:
+            rollup.update(event)
+        source.commit(offsets)
+        write_json(state_path, {"offsets": source.offsets, "rollup": rollup.to_dict()})
+        consumed += len(events)
+    return consumed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll up the conversation events of the file event broker")
+    parser.add_argument("--events", default="analytics/events", help="directory of the event segments")
+    parser.add_argument("--state", default="analytics/consumer_state.json", help="offsets and rollup state")
+    parser.add_argument("--output", default="analytics/stats.json", help="rolled up stats")
+    parser.add_argument("--funnels", help="JSON file of funnel name -> steps, default addons.analytics")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--interval", type=float, default=0, help="seconds between runs, 0 to run once")
+    parser.add_argument("--delete-consumed", action="store_true", help="delete the consumed segments")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    funnels = None
+    if args.funnels:
+        with open(args.funnels, encoding="utf-8") as f:
+            funnels = json.load(f)
+    state = {}
+    if os.path.isfile(args.state):
+        with open(args.state, encoding="utf-8") as f:
+            state = json.load(f)
+    source = FileEventSource(args.events, state.get("offsets"))
+    rollup = Rollup.from_dict(state.get("rollup", {}), funnels)
+
+    while True:
+        started = time.perf_counter()
+        consumed = consume(source, rollup, args.state, args.batch_size)
+        rollup.prune()
+        if args.delete_consumed:
+            source.delete_consumed()
+        write_json(args.state, {"offsets": source.offsets, "rollup": rollup.to_dict()})
+        write_json(args.output, rollup.report())
+        logger.info(f"{consumed} events rolled up in {time.perf_counter() - started:.1f}s")
+        if args.interval <= 0:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compact the conversations of the Redis tracker store which have more than max_events events,
+once or every --interval seconds
+
+    python -m scripts.compact_trackers --endpoints endpoints.redis.yml --interval 3600
+"""
+import argparse
+import logging
+import time
+
+from rasa.shared.core.domain import Domain
+
+from addons.tracker_store import CompactRedisTrackerStore
+from scripts.migrate_tracker_store import create_store
+
+logger = logging.getLogger(__name__)
+
+
+def compact_all(store: CompactRedisTrackerStore) -> int:
+    """
+    :return: number of compacted conversations
+    """
+    compacted = 0
+    for sender_id in store.keys():
+        try:
+            compacted += store.compact(sender_id)
+        except Exception as e:
+            logger.warning(f"Can not compact conversation {sender_id}: {e}")
+    return compacted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact the long conversations of the Redis tracker store")
+    parser.add_argument("--endpoints", default="endpoints.redis.yml")
+    parser.add_argument("--domain", default="domain.yml")
+    parser.add_argument("--max-events", type=int, help="override max_events of the tracker store")
+    parser.add_argument("--keep-events", type=int, help="override keep_events of the tracker store")
+    parser.add_argument("--interval", type=float, default=0, help="seconds between runs, 0 to run once")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    store = create_store(args.endpoints, Domain.load(args.domain))
+    if not isinstance(store, CompactRedisTrackerStore):
+        parser.error(f"The tracker store of {args.endpoints} is not CompactRedisTrackerStore")
+    if args.max_events:
+        store.max_events = args.max_events
+    if args.keep_events:
+        store.keep_events = args.keep_events
+    while True:
+        started = time.perf_counter()
+        compacted = compact_all(store)
+        logger.info(f"{compacted} conversations compacted in {time.perf_counter() - started:.1f}s")
+        if args.interval <= 0:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
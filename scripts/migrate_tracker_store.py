@@ -0,0 +1,72 @@
+"""
+Copy the conversations of a tracker store to another one, e.g. from the SQL tracker store to the compact Redis store
+
+    python -m scripts.migrate_tracker_store --source endpoints.yml --target endpoints.redis.yml
+
+Both files are endpoint files whose tracker_store section configures the store.
+"""
+import argparse
+import logging
+import time
+from typing import Dict, Text
+
+from rasa.core.tracker_store import TrackerStore
+from rasa.shared.core.domain import Domain
+from rasa.utils.endpoints import read_endpoint_config
+
+logger = logging.getLogger(__name__)
+
+
+def create_store(endpoints: Text, domain: Domain) -> TrackerStore:
+    config = read_endpoint_config(endpoints, "tracker_store")
+    if config is None:
+        raise ValueError(f"No tracker_store section in {endpoints}")
+    return TrackerStore.create(config, domain=domain)
+
+
+def migrate(source: TrackerStore, target: TrackerStore, skip_existing: bool = True) -> Dict[Text, int]:
+    """
+    Copy every conversation of source to target
+    :param skip_existing: keep the conversations which already exist in target
+    :return: number of copied, skipped and failed conversations and of copied events
+    """
+    counts = {"copied": 0, "skipped": 0, "failed": 0, "events": 0}
+    existing = set(target.keys()) if skip_existing else set()
+    for sender_id in source.keys():
+        if sender_id in existing:
+            counts["skipped"] += 1
+            continue
+        try:
+            tracker = source.retrieve(sender_id)
+            if tracker is None:
+                counts["skipped"] += 1
+                continue
+            target.save(tracker)
+        except Exception as e:
+            logger.warning(f"Can not migrate conversation {sender_id}: {e}")
+            counts["failed"] += 1
+            continue
+        counts["copied"] += 1
+        counts["events"] += len(tracker.events)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy the conversations of a tracker store to another one")
+    parser.add_argument("--source", required=True, help="endpoints file of the store to read")
+    parser.add_argument("--target", default="endpoints.redis.yml", help="endpoints file of the store to write")
+    parser.add_argument("--domain", default="domain.yml")
+    parser.add_argument("--overwrite", action="store_true", help="copy conversations already in the target")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    domain = Domain.load(args.domain)
+    source, target = create_store(args.source, domain), create_store(args.target, domain)
+    started = time.perf_counter()
+    counts = migrate(source, target, skip_existing=not args.overwrite)
+    logger.info(f"{counts['copied']} conversations ({counts['events']} events) copied, {counts['skipped']} skipped, "
+                f"{counts['failed']} failed in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
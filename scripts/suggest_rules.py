@@ -0,0 +1,103 @@
+"""
+Find the intents of the stories which are always answered by the same actions, outside of forms,
+and suggest them as rules so RulePolicy predicts them without the neural policies
+
+    python -m scripts.suggest_rules --min-count 2
+"""
+import argparse
+from collections import defaultdict
+from typing import Dict, List, Set, Text, Tuple
+
+from ruamel.yaml import YAML
+
+
+def read_yaml(path: Text):
+    with open(path, encoding="utf-8") as f:
+        return YAML(typ="safe").load(f) or {}
+
+
+def intent_answers(paths: List[Text]) -> Dict[Text, List[Tuple[Text, ...]]]:
+    """
+    Collect the actions predicted after every user turn of the stories
+    :param paths: story files
+    :return: intent -> actions after each of its turns, None for turns which run or activate a form
+    """
+    answers = defaultdict(list)
+    for path in paths:
+        for story in read_yaml(path).get("stories", []):
+            intent = None
+            in_form = form_turn = False
+            actions = []
+            for step in story.get("steps", []) + [{"intent": None}]:
+                if "intent" in step:
+                    if intent is not None:
+                        answers[intent].append(None if form_turn else tuple(actions))
+                    intent = step["intent"]
+                    form_turn = in_form
+                    actions = []
+                elif "active_loop" in step:
+                    in_form = step["active_loop"] is not None
+                    form_turn = True
+                elif "action" in step:
+                    actions.append(step["action"])
+    return answers
+
+
+def rule_intents(paths: List[Text]) -> Set[Text]:
+    """
+    Intents already answered by an unconditional rule
+    """
+    intents = set()
+    for path in paths:
+        for rule in read_yaml(path).get("rules", []):
+            steps = rule.get("steps", [])
+            if "condition" not in rule and len(steps) > 0 and "intent" in steps[0]:
+                intents.add(steps[0]["intent"])
+    return intents
+
+
+def candidates(answers: Dict[Text, List], min_count: int) -> List[Tuple[Text, Tuple[Text, ...], int]]:
+    """
+    :return: (intent, actions, count) of the intents always answered by the same non empty actions
+    """
+    found = []
+    for intent, turns in sorted(answers.items()):
+        if len(turns) < min_count or None in turns:
+            continue
+        distinct = set(turns)
+        if len(distinct) == 1 and len(turns[0]) > 0:
+            found.append((intent, turns[0], len(turns)))
+    return found
+
+
+def rule_yaml(intent: Text, actions: Tuple[Text, ...]) -> Text:
+    steps = "\n".join(f"  - action: {action}" for action in actions)
+    return f"- rule: Answer {intent}\n  steps:\n  - intent: {intent}\n{steps}\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suggest rules for intents always answered by the same actions")
+    parser.add_argument("--stories", nargs="+", default=["data/stories.yml"])
+    parser.add_argument("--rules", nargs="+", default=["data/rules.yml"])
+    parser.add_argument("--min-count", type=int, default=2, help="minimum number of turns of the intent")
+    args = parser.parse_args()
+
+    answers = intent_answers(args.stories)
+    covered = rule_intents(args.rules)
+    print(f"{'intent':<28}{'turns':>8}{'answers':>10}  status")
+    for intent, turns in sorted(answers.items()):
+        status = "rule" if intent in covered else ("in form" if None in turns else "")
+        print(f"{intent:<28}{len(turns):>8}{len(set(turns)):>10}  {status}")
+
+    suggested = [x for x in candidates(answers, args.min_count) if x[0] not in covered]
+    print()
+    if len(suggested) == 0:
+        print("No new rule to suggest")
+        return
+    print(f"Suggested rules ({sum(count for _, _, count in suggested)} turns of the stories):\n")
+    for intent, actions, _ in suggested:
+        print(rule_yaml(intent, actions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("rasa_sdk")
+
+from rasa_sdk import Tracker
+from rasa_sdk.events import FollowupAction, SlotSet
+from rasa_sdk.executor import CollectingDispatcher
+
+from actions import actions
+from actions.api import ApiResponse, ServiceUnavailable, client
+from actions.cache import TTLCache
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    responses = {}
+    requests = []
+
+    async def send(method, path, params, data, access_token):
+        requests.append(path)
+        if isinstance(responses[path], Exception):
+            raise responses[path]
+        status, body = responses[path]
+        return ApiResponse(status, json.dumps(body).encode())
+
+    monkeypatch.setattr(client, "_send", send)
+    monkeypatch.setattr(actions, "course_cache", TTLCache())
+    monkeypatch.setattr(actions, "role_cache", TTLCache())
+    return responses, requests
+
+
+def test_resolve_course_does_not_cache_errors(backend):
+    responses, requests = backend
+    responses["/similar-courses"] = (500, {"message": "Server Error"})
+    with pytest.raises(ServiceUnavailable):
+        asyncio.run(actions.resolve_course("Python", use_catalog=False))
+
+    course = {"id": 1, "name": "Python"}
+    responses["/similar-courses"] = (200, {"data": {"course": course, "extras": []}})
+    assert asyncio.run(actions.resolve_course("Python", use_catalog=False))["course"] == course
+    assert asyncio.run(actions.resolve_course("python", use_catalog=False))["course"] == course
+    assert len(requests) == 2
+
+
+def tracker(**slots):
+    return Tracker(sender_id="test", slots=slots, latest_message={"text": "", "intent": {}, "entities": []},
+                   events=[], paused=False, followup_action=None, active_loop={}, latest_action_name=None)
+
+
+def texts(dispatcher):
+    return [message.get("text") or message.get("custom", {}).get("text") for message in dispatcher.messages]
+
+
+def test_refused_role_is_cached(backend):
+    responses, requests = backend
+    responses["/is-admin"] = (403, {"message": "Forbidden"})
+
+    assert not asyncio.run(actions.has_role("admin", "token"))
+    assert not asyncio.run(actions.has_role("admin", "token"))
+    assert requests == ["/is-admin"]
+
+
+def test_login_tells_which_queued_action_is_refused(backend):
+    responses, requests = backend
+    responses["/login"] = (200, {"success": True, "data": {"name": "Student", "token": "token"}})
+    responses["/is-admin"] = (200, {"data": False})
+    responses["/courses/my-courses"] = (200, {"data": []})
+    dispatcher = CollectingDispatcher()
+    events = asyncio.run(actions.ActionAccessAndPerform().run(dispatcher, tracker(
+        email="student@ilearning.com", password="secret", pending_action="action_show_pending_courses",
+        pending_actions=["action_show_pending_courses", "action_show_my_courses"]), {}))
+
+    assert texts(dispatcher)[0] == "Sorry, I can not show the pending courses: Need to login into admin account"
+    assert requests.count("/is-admin") == 1
+    assert SlotSet("pending_actions", None) in events
+
+
+def test_login_is_kept_when_a_queued_action_fails(backend):
+    responses, requests = backend
+    responses["/login"] = (200, {"success": True, "data": {"name": "Student", "token": "token"}})
+    responses["/similar-courses"] = ServiceUnavailable("catalog", "circuit breaker is open")
+    dispatcher = CollectingDispatcher()
+    events = asyncio.run(actions.ActionAccessAndPerform().run(dispatcher, tracker(
+        email="student@ilearning.com", password="secret", course_name="Python",
+        pending_action="action_enroll_course", pending_actions=["action_enroll_course"]), {}))
+
+    assert dispatcher.messages[-1]["response"] == "utter_service_busy"
+    assert events == [SlotSet("access_token", "token"), SlotSet("name", "Student"), SlotSet("pending_action", None),
+                      SlotSet("pending_actions", None)]
+
+
+def test_queue_after_a_form_is_dropped(monkeypatch):
+    class Form:
+        @staticmethod
+        async def perform(**kwargs):
+            return [FollowupAction("add_resource_form")]
+
+    monkeypatch.setitem(actions.pending_action_registry, "action_add_resource", Form)
+    dispatcher = CollectingDispatcher()
+    events = asyncio.run(actions.ActionAccessAndPerform.perform_pending_actions(
+        dispatcher, tracker(), {}, "token", ["action_add_resource", "action_show_my_courses"]))
+
+    assert events == [FollowupAction("add_resource_form")]
+    assert texts(dispatcher) == ["Please ask me again to show your courses afterwards"]
+
+
+def test_listing_error_is_ignored_when_the_role_check_fails(backend, monkeypatch):
+    responses, requests = backend
+    responses["/is-admin"] = (200, {"data": False})
+    client_get = client.get
+
+    async def get(path, **kwargs):
+        if path == "/courses/pending":
+            raise ServiceUnavailable("admin", "circuit breaker is open")
+        return await client_get(path, **kwargs)
+
+    monkeypatch.setattr(client, "get", get)
+    dispatcher = CollectingDispatcher()
+    events = asyncio.run(actions.ActionShowPendingCourses.perform(dispatcher, tracker(access_token="token")))
+
+    assert texts(dispatcher) == ["Need to login into admin account"]
+    assert FollowupAction("login_form") in events
+
+
+def test_suggestion_without_id_is_only_remembered_by_name(backend):
+    responses, requests = backend
+    responses["/similar-courses"] = (200, {"data": {"course": None, "extras": [{"name": "Python Basics"}]}})
+    dispatcher = CollectingDispatcher()
+    events = asyncio.run(actions.EnrollCourse.perform(dispatcher, tracker(course_name="Pyton")))
+
+    assert events == [SlotSet("likely_course", "Python Basics"), FollowupAction("utter_course_not_found_and_suggest")]
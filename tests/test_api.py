@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from actions.api import ApiResponse, CircuitBreaker, ILearningClient, ServiceUnavailable
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker("catalog", failure_threshold=3, reset_timeout=30, timer=Clock())
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+
+
+def test_breaker_half_open_lets_one_probe_through():
+    clock = Clock()
+    breaker = CircuitBreaker("catalog", failure_threshold=1, reset_timeout=30, timer=clock)
+    breaker.record_failure()
+    clock.now = 30
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_breaker_failed_probe_opens_again():
+    clock = Clock()
+    breaker = CircuitBreaker("catalog", failure_threshold=5, reset_timeout=30, timer=clock)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now = 30
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    clock.now = 60
+    assert breaker.allow()
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = ILearningClient("http://ilearning.test/api")
+    sent = []
+
+    async def send(method, path, params, data, access_token):
+        sent.append((path, access_token))
+        await asyncio.sleep(0.01)
+        return ApiResponse(200, json.dumps({"data": [path]}).encode())
+
+    monkeypatch.setattr(api, "_send", send)
+    return api, sent
+
+
+def test_identical_gets_share_one_request(api):
+    api, sent = api
+
+    async def run():
+        return await asyncio.gather(*[api.get("/courses", params={"limit": 5}) for _ in range(3)],
+                                    api.get("/courses", params={"limit": 5}, access_token="token"))
+
+    responses = asyncio.run(run())
+
+    assert [response.json()["data"] for response in responses] == [["/courses"]] * 4
+    assert sent == [("/courses", None), ("/courses", "token")]
+    assert api.singleflight_stats == {"requests": 4, "coalesced": 2}
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_request(api):
+    api, sent = api
+
+    async def run():
+        first = asyncio.ensure_future(api.get("/courses"))
+        second = asyncio.ensure_future(api.get("/courses"))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()).ok
+    assert len(sent) == 1
+
+
+def test_open_breaker_serves_the_stale_public_response():
+    api = ILearningClient("http://ilearning.test/api", breaker={"failure_threshold": 1})
+    api.stale.set(("/courses", ()), ApiResponse(200, b'{"data": []}'))
+    api.breakers["catalog"].record_failure()
+
+    assert asyncio.run(api.get("/courses")).json() == {"data": []}
+    with pytest.raises(ServiceUnavailable):
+        asyncio.run(api.get("/courses", access_token="token"))
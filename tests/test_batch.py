@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("rasa_sdk")
+
+from actions import batch
+from actions.api import ApiResponse, client
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    responses = {}
+
+    async def send(method, path, params, data, access_token):
+        if path not in responses:
+            raise RuntimeError(f"Unexpected request {path}")
+        status, body = responses[path]
+        return ApiResponse(status, json.dumps(body).encode())
+
+    monkeypatch.setattr(client, "_send", send)
+    return responses
+
+
+def test_job_fails_when_the_api_rejects_the_token(backend):
+    backend["/courses/my-courses"] = (401, {"message": "Unauthenticated"})
+    result = asyncio.run(batch.run_job({"id": 1, "access_token": "expired"}, "my_courses", 5))
+
+    assert not result["ok"]
+    assert result["error"] == "ILearning API answered 401"
+
+
+def test_job_succeeds_with_the_data(backend):
+    backend["/courses/my-courses"] = (200, {"data": [{"id": 1, "name": "Python", "price": 0}]})
+    result = asyncio.run(batch.run_job({"id": 1, "access_token": "token"}, "my_courses", 5))
+
+    assert result["ok"]
+    assert "Python" in result["messages"][0]["custom"]["text"]
+
+
+def test_unexpected_error_is_a_failed_job(backend):
+    result = asyncio.run(batch.run_job({"id": 1, "access_token": "token"}, "my_courses", 5))
+
+    assert not result["ok"]
+    assert "Unexpected request" in result["error"]
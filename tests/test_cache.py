@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+redis = pytest.importorskip("redis")
+
+from actions.cache import RedisCache, TTLCache
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class BrokenRedis:
+
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        raise redis.ConnectionError("down")
+
+
+@pytest.fixture
+def red():
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeStrictRedis(decode_responses=True)
+
+
+def test_redis_cache_async_methods(red):
+    cache = RedisCache(red, "test:", ttl=60)
+
+    async def run():
+        await cache.aset(("show", (("page", 1),), "admin"), {"rows": [1]})
+        assert await cache.aget(("show", (("page", 1),), "admin")) == {"rows": [1]}
+        await cache.ainvalidate_where(lambda key: key[0] == "show")
+        return await cache.aget(("show", (("page", 1),), "admin"))
+
+    assert asyncio.run(run()) is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "sets": 1, "errors": 0}
+
+
+def test_redis_cache_stats_do_not_scan(red):
+    cache = RedisCache(red, "test:", ttl=60)
+    cache.set("key", 1)
+    red.scan_iter = None
+
+    assert cache.stats()["sets"] == 1
+
+
+def test_redis_cache_skips_redis_after_failure():
+    clock = Clock()
+    client = BrokenRedis()
+    cache = RedisCache(client, "test:", ttl=60, retry_interval=1, timer=clock)
+
+    assert cache.get("key") is None
+    assert cache.get("key") is None
+    assert client.calls == 1
+    clock.now = 1.5
+    assert cache.get("key") is None
+    assert client.calls == 2
+    assert cache.stats()["errors"] == 2
+
+
+def test_ttl_cache_entries_expire():
+    clock = Clock()
+    cache = TTLCache(max_size=10, ttl=60, timer=clock)
+    cache.set("python", {"id": 1})
+    clock.now = 59.9
+    assert cache.get("python") == {"id": 1}
+
+    clock.now = 60
+    assert cache.get("python") is None
+    assert len(cache) == 0
+    assert cache.stats() == {"size": 0, "hits": 1, "misses": 1}
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_invalidation():
+    cache = TTLCache()
+    for page in (1, 2):
+        cache.set(("action_show_resources", (("page", page),), "admin"), page)
+        cache.set(("action_show_pending_courses", (("page", page),), "admin"), page)
+    cache.invalidate(("action_show_pending_courses", (("page", 1),), "admin"))
+    cache.invalidate_where(lambda key: key[0] == "action_show_resources")
+
+    assert len(cache) == 1
+    assert cache.get(("action_show_pending_courses", (("page", 2),), "admin")) == 2
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_login_roles_are_cached_as_stated(monkeypatch):
+    from actions import cache
+
+    monkeypatch.setattr(cache, "role_cache", TTLCache())
+    asyncio.run(cache.remember_roles("admin-token", {"roles": [{"name": "admin"}]}))
+    asyncio.run(cache.remember_roles("author-token", {"roles": ["author"]}))
+    asyncio.run(cache.remember_roles("flag-token", {"is_admin": False, "is_author": True}))
+
+    assert cache.role_cache.get("admin-token") == {"admin": True}
+    assert cache.role_cache.get("author-token") == {"admin": False, "author": True}
+    assert cache.role_cache.get("flag-token") == {"admin": False, "author": True}
@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from actions import catalog as catalog_module
+from actions.api import ApiResponse
+from actions.catalog import CatalogIndex
+
+
+class FakeClient:
+    """
+    /courses of the ILearning API with cursor pagination and updated_since
+    """
+
+    def __init__(self, courses):
+        self.courses = courses
+        self.requests = []
+
+    async def get(self, path, params=None, access_token=None):
+        self.requests.append((path, params))
+        courses = [course for course in self.courses
+                   if params.get("updated_since") is None or course.get("updated_at", 0) >= params["updated_since"]]
+        start = params.get("cursor") or 0
+        page = courses[start:start + params["limit"]]
+        next_cursor = start + params["limit"] if start + params["limit"] < len(courses) else None
+        return ApiResponse(200, json.dumps({"data": page, "next_cursor": next_cursor}).encode())
+
+
+def courses(count):
+    return [{"id": i, "name": f"Course {i}", "price": 0} for i in range(1, count + 1)]
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = FakeClient(courses(2000))
+    monkeypatch.setattr(catalog_module, "client", client)
+    return client
+
+
+def test_lookup_before_load_uses_api():
+    index = CatalogIndex()
+
+    assert index.lookup("Course 1") is None
+
+
+def test_refresh_loads_all_pages(fake_client):
+    index = CatalogIndex(page_size=500)
+    asyncio.run(index.refresh())
+
+    assert len(index) == 2000
+    assert len(fake_client.requests) == 4
+
+
+def test_lookup_exact_name(fake_client):
+    index = CatalogIndex(page_size=500)
+    asyncio.run(index.refresh())
+
+    assert index.lookup("  course   42 ") == {"course": {"id": 42, "name": "Course 42", "price": 0}, "extras": []}
+
+
+def test_lookup_miss_is_not_authoritative(fake_client):
+    index = CatalogIndex(page_size=500)
+    asyncio.run(index.refresh())
+
+    # Maybe published since the last refresh, the API must answer
+    assert index.lookup("Course 2001") is None
+    suggestions = index.suggest("Course 2001")
+    assert suggestions["course"] is None
+    assert len(suggestions["extras"]) > 0
+
+
+def test_refresh_adds_updated_and_removes_deleted_courses(fake_client):
+    index = CatalogIndex(page_size=500)
+    asyncio.run(index.refresh())
+    fake_client.courses = [course for course in fake_client.courses if course["id"] != 7]
+    fake_client.courses.append({"id": 2001, "name": "Course 2001", "price": 10, "updated_at": 2 ** 40})
+
+    asyncio.run(index.refresh())
+    assert index.lookup("Course 2001")["course"]["price"] == 10
+    assert index.lookup("Course 7") is not None
+
+    asyncio.run(index.refresh(full=True))
+    assert index.lookup("Course 7") is None
+    assert len(index) == 2000
+
+
+def test_shared_catalog_lock_has_one_holder():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    red = fakeredis.FakeStrictRedis(decode_responses=True)
+    first = catalog_module.SharedCatalog(red, "catalog:", 10)
+    second = catalog_module.SharedCatalog(red, "catalog:", 10)
+
+    assert first.acquire()
+    assert first.acquire()
+    assert not second.acquire()
+    red.delete("catalog:lock")
+    assert second.acquire()
+    assert not first.acquire()
@@ -0,0 +1,80 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("rasa")
+
+from addons import analytics, event_broker
+from addons.analytics import FileEventSource
+from addons.event_broker import FileEventBroker
+
+
+def consume(source):
+    events = []
+    for batch, offsets in source.batches(100):
+        events += batch
+        source.commit(offsets)
+    return events
+
+
+def test_last_segment_of_a_writer_is_deleted_once_consumed(tmp_path):
+    broker = FileEventBroker(str(tmp_path), flush_interval=3600)
+    source = FileEventSource(str(tmp_path))
+    broker.publish({"event": "user", "text": "hello"})
+    broker.flush()
+
+    assert consume(source) == [{"event": "user", "text": "hello"}]
+    assert source.delete_consumed(grace=0) == 0
+    assert source.delete_consumed(grace=0) == 1
+    assert source.segments() == []
+
+    broker.publish({"event": "user", "text": "next"})
+    asyncio.run(broker.close())
+
+    assert consume(source) == [{"event": "user", "text": "next"}]
+
+
+def test_write_racing_with_the_claim_is_consumed(tmp_path, monkeypatch):
+    broker = FileEventBroker(str(tmp_path), flush_interval=3600)
+    source = FileEventSource(str(tmp_path))
+    broker.publish({"event": "user", "text": "hello"})
+    broker.flush()
+    consume(source)
+
+    # The writer appends after the consumer measured the segment, then again after its check of the path passed
+    getsize = os.path.getsize
+
+    def write_after_getsize(path):
+        size = getsize(path)
+        broker.publish({"event": "user", "text": "during the check"})
+        broker.flush()
+        monkeypatch.setattr(analytics.os.path, "getsize", getsize)
+        return size
+
+    monkeypatch.setattr(analytics.os.path, "getsize", write_after_getsize)
+    monkeypatch.setattr(event_broker.os.path, "exists", lambda path: True)
+    source.delete_consumed(grace=0)
+    broker.publish({"event": "user", "text": "after the claim"})
+    broker.flush()
+    monkeypatch.undo()
+
+    assert source.delete_consumed(grace=0) == 0
+    assert consume(source) == [{"event": "user", "text": "during the check"},
+                               {"event": "user", "text": "after the claim"}]
+    assert source.delete_consumed(grace=0) == 1
+    asyncio.run(broker.close())
+
+
+def test_segment_is_kept_until_consumed(tmp_path):
+    broker = FileEventBroker(str(tmp_path), flush_interval=3600)
+    source = FileEventSource(str(tmp_path))
+    broker.publish({"event": "user", "text": "hello"})
+    broker.flush()
+    consume(source)
+    broker.publish({"event": "user", "text": "again"})
+    broker.flush()
+
+    assert source.delete_consumed() == 0
+    assert consume(source) == [{"event": "user", "text": "again"}]
+    asyncio.run(broker.close())
@@ -0,0 +1,99 @@
+import pytest
+
+pytest.importorskip("rasa")
+fakeredis = pytest.importorskip("fakeredis")
+
+from rasa.shared.core.domain import Domain
+from rasa.shared.core.events import ActionExecuted, BotUttered, SessionStarted, SlotSet, UserUttered
+from rasa.shared.core.trackers import DialogueStateTracker
+
+from addons.tracker_store import CompactRedisTrackerStore, decode_events, encode_events, msgpack
+
+domain = Domain.from_yaml("""
+version: "2.0"
+slots:
+  name:
+    type: text
+    influence_conversation: false
+""")
+
+
+def create_store(tmp_path, **kwargs):
+    store = CompactRedisTrackerStore(domain, archive={"interval": 3600, "dialect": "sqlite",
+                                                      "db": str(tmp_path / "archive.db")}, **kwargs)
+    store.red = fakeredis.FakeStrictRedis()
+    store.archive.red = store.red
+    return store
+
+
+def session_events():
+    return [ActionExecuted("action_session_start"), SessionStarted(), ActionExecuted("action_listen")]
+
+
+def turn_events(turn):
+    return [UserUttered(f"hello {turn}", {"name": "greet", "confidence": 1.0}), ActionExecuted("utter_greet"),
+            SlotSet("name", f"user {turn}"), BotUttered(f"Hi {turn}"), ActionExecuted("action_listen")]
+
+
+def play_turn(store, sender_id, events):
+    tracker = store.retrieve(sender_id) or DialogueStateTracker(sender_id, domain.slots)
+    for event in events:
+        tracker.update(event)
+    store.save(tracker)
+    return tracker
+
+
+def archived_events(store, sender_id):
+    store.archive.flush()
+    with store.archive.store.session_scope() as session:
+        rows = session.query(store.archive.store.SQLEvent).filter_by(sender_id=sender_id) \
+            .order_by(store.archive.store.SQLEvent.id).all()
+        return [(row.type_name, row.timestamp) for row in rows]
+
+
+@pytest.mark.parametrize("use_msgpack", [True, False])
+def test_encode_decode_round_trip(monkeypatch, use_msgpack):
+    if not use_msgpack:
+        monkeypatch.setattr("addons.tracker_store.msgpack", None)
+    elif msgpack is None:
+        pytest.skip("msgpack is not installed")
+    events = [event.as_dict() for event in session_events() + turn_events(1)]
+
+    assert decode_events(encode_events(events)) == events
+
+
+def test_archive_two_sessions_without_duplicates(tmp_path):
+    store = create_store(tmp_path)
+    played = []
+    for session in range(2):
+        events = session_events()
+        played += events
+        play_turn(store, "user", events)
+        for turn in range(3):
+            events = turn_events(f"{session}-{turn}")
+            played += events
+            play_turn(store, "user", events)
+            # Flush between saves like the background thread
+            archived_events(store, "user")
+
+    archived = archived_events(store, "user")
+    assert len(archived) == len(played)
+    assert archived == [(event.type_name, event.timestamp) for event in played]
+
+
+def test_archive_compacted_conversation(tmp_path):
+    store = create_store(tmp_path, max_events=15, keep_events=5)
+    played = session_events()
+    play_turn(store, "user", list(played))
+    for turn in range(10):
+        events = turn_events(turn)
+        played += events
+        play_turn(store, "user", events)
+        if turn % 3 == 0:
+            archived_events(store, "user")
+
+    # The conversation in Redis is shorter than the archived conversation
+    assert len(store.retrieve_events("user")) < len(played)
+    archived = archived_events(store, "user")
+    assert archived == [(event.type_name, event.timestamp) for event in played]
+    assert store.retrieve("user").get_slot("name") == "user 9"